@@ -1,12 +1,13 @@
 """Agent imports and initialization module."""
 from agents.router import route_message
-from agents.knowledge import knowledge_agent
+from agents.knowledge import knowledge_agent, run_knowledge_query
 from agents.support import customer_support_agent
 from agents.personality import personality_agent
 
 __all__ = [
     'route_message',
     'knowledge_agent',
+    'run_knowledge_query',
     'customer_support_agent',
     'personality_agent'
 ]
@@ -0,0 +1,11 @@
+"""Timestamp helper shared by the agents."""
+from datetime import datetime
+
+
+def now_str() -> str:
+    """Return the current local time as "YYYY-MM-DD HH:MM:SS".
+
+    isoformat is a C fast path and produces the same text as
+    strftime("%Y-%m-%d %H:%M:%S") with these arguments.
+    """
+    return datetime.now().isoformat(sep=" ", timespec="seconds")
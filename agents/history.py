@@ -0,0 +1,74 @@
+"""Conversation history trimming shared by the agents."""
+import asyncio
+from typing import List, Optional, Tuple
+from langchain_core.messages import BaseMessage, SystemMessage
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_groq import ChatGroq
+from clients import HTTP_CLIENT, HTTP_ASYNC_CLIENT
+from state import AgentState
+from dotenv import load_dotenv
+
+load_dotenv()
+
+llm = ChatGroq(
+    model="meta-llama/llama-4-maverick-17b-128e-instruct",
+    temperature=0,
+    http_client=HTTP_CLIENT,
+    http_async_client=HTTP_ASYNC_CLIENT
+)
+
+# Number of most recent messages forwarded verbatim to the LLMs
+KEEP_LAST = 6
+
+_SUMMARY_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", """Summarize the conversation below for a customer service agent of InfinitePay.
+    Keep every fact the customer shared (products, issues, tickets, appointments, dates) and
+    any commitments made by the agents. Reply with the summary only, in at most 150 words."""),
+    MessagesPlaceholder(variable_name="messages")
+])
+_SUMMARY_CHAIN = _SUMMARY_PROMPT | llm
+
+async def _summarize(pending: List[BaseMessage], previous: Optional[str], upto: int) -> Tuple[str, int]:
+    """Extend the previous summary with the pending messages; returns it with the new boundary."""
+    if previous:
+        pending = [SystemMessage(content=f"Summary so far: {previous}")] + pending
+    return (await _SUMMARY_CHAIN.ainvoke({"messages": pending})).content, upto
+
+def trim_history(state: AgentState, keep_last: int = KEEP_LAST) -> List[BaseMessage]:
+    """Return the messages to forward to an LLM: a summary of older turns plus the latest ones.
+
+    The summary is cached in state["history_summary"] and extended in a background
+    task (state["history_summary_task"]) with the messages that fell out of the window,
+    so no caller waits on it. Until the task finishes, callers get the previous summary
+    followed by every message after it, or the untrimmed history if there is none yet.
+    Must be called from a running event loop.
+
+    Args:
+        state: The agent state holding the conversation messages
+        keep_last: Number of most recent messages forwarded verbatim
+
+    Returns:
+        The full history when it is short, otherwise the summary followed by the newer messages
+    """
+    messages = state.get("messages", [])
+    if len(messages) <= keep_last + 2:
+        return messages
+
+    # Fold in a summary that finished since the last call; a failed one is simply retried
+    task = state.get("history_summary_task")
+    if task is not None and task.done():
+        del state["history_summary_task"]
+        if not task.cancelled() and task.exception() is None:
+            state["history_summary"], state["history_summary_upto"] = task.result()
+        task = None
+
+    prefix_end = len(messages) - keep_last
+    summarized = state.get("history_summary_upto", 0)
+    if task is None and prefix_end > summarized:
+        state["history_summary_task"] = asyncio.create_task(
+            _summarize(messages[summarized:prefix_end], state.get("history_summary"), prefix_end)
+        )
+
+    if not state.get("history_summary"):
+        return messages
+    return [SystemMessage(content=f"Conversation summary: {state['history_summary']}")] + messages[summarized:]
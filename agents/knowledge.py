@@ -1,13 +1,19 @@
-from datetime import datetime
-from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
-from state import AgentState
+import asyncio
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, SystemMessage
+from state import AgentState, ensure_state
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.runnables import RunnableConfig
 from langchain_core.agents import AgentFinish
 from langchain_groq import ChatGroq
-from langchain.agents import AgentExecutor, create_react_agent
+from clients import HTTP_CLIENT, HTTP_ASYNC_CLIENT
 from langchain_community.tools.tavily_search import TavilySearchResults
-from langchain import hub
 from tools import rag_search
+from agents.personality import PERSONALITY_GUIDELINES
+from agents._time import now_str
+from agents.history import trim_history
 from dotenv import load_dotenv
 
 
@@ -16,24 +22,162 @@ load_dotenv()
 
 llm = ChatGroq(
     model="meta-llama/llama-4-maverick-17b-128e-instruct",
-    temperature=0
+    temperature=0,
+    http_client=HTTP_CLIENT,
+    http_async_client=HTTP_ASYNC_CLIENT
 )
 
-def knowledge_agent(state: AgentState) -> AgentState:
+# Tools, prompts and chains are invariant across calls, so build them once at import.
+# A single Tavily instance keeps one API wrapper (and its session) for every web search.
+_WEB_SEARCH = TavilySearchResults(max_results=5)
+_TOOLS_BY_NAME = {"rag_search": rag_search, "web_search": _WEB_SEARCH}
+
+# Planning prompt: one LLM call decides every tool query up front
+_PLANNER_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", """You plan tool calls for a knowledge agent specializing in InfinitePay's services and products.
+
+    YOUR TOOLS:
+    1. rag_search: Find information from InfinitePay's official documentation
+    2. web_search: Find general information from the web
+
+    INSTRUCTIONS:
+    1. Always include a rag_search call for InfinitePay-specific information
+    2. Add a web_search call for complementary or general information
+    3. Write a focused search query for each tool
+
+    Return ONLY a JSON list, without any explanation, in this exact format:
+    [{{"tool": "rag_search", "query": "..."}}, {{"tool": "web_search", "query": "..."}}]"""),
+    ("human", "{input}")
+])
+
+# Define the agent's prompt: fixed system text first, per-turn history, input and
+# observations last so the prompt prefix stays byte-identical across turns
+_KNOWLEDGE_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", """You are a knowledgeable agent specializing in InfinitePay's services and products.
+    
+    YOUR TOOLS:
+    1. rag_search: Find information from InfinitePay's official documentation
+    2. web_search: Find general information from the web
+    
+    INSTRUCTIONS:
+    1. Always use rag_search FIRST for InfinitePay-specific information
+    2. Use web_search for complementary or general information
+    3. Combine information from both sources when relevant
+    4. Be specific about features, pricing, and requirements
+    5. Always validate web search information against official docs
+    6. If information conflicts, trust rag_search over web_search
+    
+    RESPONSE GUIDELINES:
+    1. Be concise but comprehensive
+    2. Structure information clearly with categories or bullet points
+    3. Include specific details about:
+       - Features and benefits
+       - Pricing if available
+       - Technical requirements
+       - Integration capabilities
+    4. Note when information is from web search vs official docs
+    5. Always ask if user needs clarification
+    
+    Keep responses professional and accurate.
+
+""" + PERSONALITY_GUIDELINES),
+    MessagesPlaceholder(variable_name="messages"),
+    ("human", "{input}\n\nTOOL OBSERVATIONS:\n{observations}")
+])
+
+_PLANNER_CHAIN = _PLANNER_PROMPT | llm
+# Tagged so streaming callers can pick the user-facing answer tokens out of the event stream
+FINAL_ANSWER_TAG = "final_answer"
+_SYNTHESIS_CHAIN = (_KNOWLEDGE_PROMPT | llm).with_config(tags=[FINAL_ANSWER_TAG])
+
+def _parse_tool_plan(content: str, user_input: str, tools_by_name: dict) -> list:
+    """Parse the planner's JSON tool list, falling back to querying every tool."""
+    try:
+        match = re.search(r"\[.*\]", content, re.DOTALL)
+        planned = json.loads(match.group(0)) if match else []
+        calls = [
+            {"tool": call["tool"], "query": str(call.get("query") or user_input)}
+            for call in planned
+            if isinstance(call, dict) and call.get("tool") in tools_by_name
+        ]
+    except (json.JSONDecodeError, TypeError):
+        calls = []
+    return calls or [{"tool": name, "query": user_input} for name in tools_by_name]
+
+async def _run_tool(tool, query: str, config: Optional[RunnableConfig] = None):
+    """Run a single tool, returning the error text as its observation on failure."""
+    try:
+        return await tool.ainvoke(query, config=config)
+    except Exception as e:
+        return f"Tool error: {str(e)}"
+
+async def run_knowledge_query(
+    user_input: str,
+    messages: List[BaseMessage],
+    config: Optional[RunnableConfig] = None
+) -> Tuple[str, Dict[str, Any]]:
+    """Answer a query from the knowledge tools without touching the agent state.
+
+    Args:
+        user_input: The user's question
+        messages: Conversation history forwarded to the synthesis prompt
+        config: The calling node's config; carries the callbacks that stream the answer
+            (on Python 3.10 they are not inherited through asyncio context)
+
+    Returns:
+        The synthesized response and the tool usage keyed by tool name
+    """
+    # Phase 1: plan all tool calls in a single LLM round trip
+    plan = await _PLANNER_CHAIN.ainvoke({"input": user_input}, config=config)
+    planned_calls = _parse_tool_plan(plan.content, user_input, _TOOLS_BY_NAME)
+
+    # Phase 2: dispatch the independent tool calls concurrently
+    observations = await asyncio.gather(*(
+        _run_tool(_TOOLS_BY_NAME[call["tool"]], call["query"], config)
+        for call in planned_calls
+    ))
+
+    # Phase 3: synthesize the final answer from all observations
+    response = await _SYNTHESIS_CHAIN.ainvoke({
+        "messages": messages,
+        "input": user_input,
+        "observations": "\n\n".join(
+            f"[{call['tool']}] {output}"
+            for call, output in zip(planned_calls, observations)
+        )
+    }, config=config)
+    
+    # Process response
+    response_content = response.content
+    
+    # Track tool usage from the gathered results
+    completed_at = now_str()
+    tool_calls = {}
+    for call, output in zip(planned_calls, observations):
+        tool_name = call["tool"]
+        if tool_name not in tool_calls:
+            tool_calls[tool_name] = {
+                "calls": [],
+                "total_uses": 0,
+                "last_used": None
+            }
+        tool_calls[tool_name]["calls"].append({
+            "input": call["query"],
+            "output": output,
+            "timestamp": completed_at
+        })
+        tool_calls[tool_name]["total_uses"] += 1
+        tool_calls[tool_name]["last_used"] = completed_at
+    
+    return response_content, tool_calls
+
+async def knowledge_agent(state: AgentState, config: RunnableConfig) -> AgentState:
     """Knowledge agent that provides information about InfinitePay services."""
+    timestamp = now_str()
     # Initialize and update state
+    ensure_state(state)
     state["current_agent"] = "knowledge"
-    if "agent_stack" not in state:
-        state["agent_stack"] = []
     state["agent_stack"].append("knowledge")
-    
-    # Initialize tool tracking state
-    if "tool_outputs" not in state:
-        state["tool_outputs"] = {}
-    if "workflow_history" not in state:
-        state["workflow_history"] = []
-    if "knowledge_context" not in state:
-        state["knowledge_context"] = {}
     state["workflow_history"].append({
         "agent_name": "knowledge",
         "action": "start_query",
@@ -42,89 +186,19 @@ def knowledge_agent(state: AgentState) -> AgentState:
             "status": "started",
             "tools_available": ["rag_search", "web_search"]
         },
-        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        "timestamp": timestamp
     })
 
-    # Initialize tools
-    web_search = TavilySearchResults(max_results=5)
-    rag_tool = rag_search
-    tools = [web_search, rag_tool]
-    
-    # Define the agent's prompt
-    knowledge_prompt = ChatPromptTemplate.from_messages([
-        ("system", """You are a knowledgeable agent specializing in InfinitePay's services and products.
-        
-        YOUR TOOLS:
-        1. rag_search: Find information from InfinitePay's official documentation
-        2. web_search: Find general information from the web
-        
-        INSTRUCTIONS:
-        1. Always use rag_search FIRST for InfinitePay-specific information
-        2. Use web_search for complementary or general information
-        3. Combine information from both sources when relevant
-        4. Be specific about features, pricing, and requirements
-        5. Always validate web search information against official docs
-        6. If information conflicts, trust rag_search over web_search
-        
-        RESPONSE GUIDELINES:
-        1. Be concise but comprehensive
-        2. Structure information clearly with categories or bullet points
-        3. Include specific details about:
-           - Features and benefits
-           - Pricing if available
-           - Technical requirements
-           - Integration capabilities
-        4. Note when information is from web search vs official docs
-        5. Always ask if user needs clarification
-        
-        Keep responses professional and accurate."""),
-        MessagesPlaceholder(variable_name="messages"),
-        ("human", "{input}")
-    ])
-    
-    # Create and configure the agent
-    prompt = hub.pull("hwchase17/react")
-    agent_with_tools = create_react_agent(
-        llm=llm,
-        tools=tools,
-        prompt=prompt
-    )
-
-    # Create the executor
-    agent_executor = AgentExecutor(
-        agent=agent_with_tools, 
-        tools=tools,
-        verbose=True,
-        handle_parsing_errors=True
-    )
-
     try:
-        # Execute the agent
-        response = agent_executor.invoke({
-            "input": state["input"]
-        })
-        
-        # Process response
-        response_content = response["output"]
-        
-        # Track tool usage from intermediate steps
-        tool_calls = {}
-        for step in response.get("intermediate_steps", []):
-            action, output = step
-            tool_name = action.tool
-            if tool_name not in tool_calls:
-                tool_calls[tool_name] = {
-                    "calls": [],
-                    "total_uses": 0,
-                    "last_used": None
-                }
-            tool_calls[tool_name]["calls"].append({
-                "input": action.tool_input,
-                "output": output,
-                "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            })
-            tool_calls[tool_name]["total_uses"] += 1
-            tool_calls[tool_name]["last_used"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        # Reuse the speculative run started alongside the router when it answered this input
+        speculative = state.pop("speculative_knowledge", None)
+        if speculative is not None and speculative["input"] == state["input"]:
+            response_content, tool_calls = await speculative["task"]
+        else:
+            if speculative is not None:
+                # Started for an input that has since changed; its answer is never used
+                speculative["task"].cancel()
+            response_content, tool_calls = await run_knowledge_query(state["input"], trim_history(state), config)
         
         # Update state with tool usage
         state["tool_outputs"].update(tool_calls)
@@ -136,7 +210,7 @@ def knowledge_agent(state: AgentState) -> AgentState:
             "input": state["input"],
             "output": response_content,
             "tool_calls": tool_calls,
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            "timestamp": now_str()
         })
         
         # Update messages
@@ -1,58 +1,42 @@
-from datetime import datetime
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
-from state import AgentState
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_groq import ChatGroq
-from dotenv import load_dotenv
+from state import AgentState, ensure_state, snapshot
+from agents._time import now_str
 
-load_dotenv()
+# Appended to the knowledge and support system prompts so their single LLM call
+# already produces the styled answer
+PERSONALITY_GUIDELINES = """PERSONALITY TRAITS:
+1. Professional yet approachable
+2. Confident but humble
+3. Clear and concise
+4. Empathetic and understanding
+5. Solution-focused
+6. Tech-savvy but accessible
 
-llm = ChatGroq(
-    model="meta-llama/llama-4-maverick-17b-128e-instruct",
-    temperature=0
-)
+COMMUNICATION GUIDELINES:
+1. Use positive language
+2. Show empathy for concerns
+3. Maintain professional tone
+4. Be clear about next steps
+5. Keep technical accuracy
+6. Preserve important details
 
-def personality_agent(state: AgentState) -> AgentState:
-    """Personality agent that formats and enhances responses."""
-    try:
-        # Define personality prompt
-        personality_prompt = ChatPromptTemplate.from_messages([
-            ("system", """You are a personality enhancement agent for InfinitePay's customer service.
-            
-            PERSONALITY TRAITS:
-            1. Professional yet approachable
-            2. Confident but humble
-            3. Clear and concise
-            4. Empathetic and understanding
-            5. Solution-focused
-            6. Tech-savvy but accessible
-            
-            COMMUNICATION GUIDELINES:
-            1. Use positive language
-            2. Show empathy for concerns
-            3. Maintain professional tone
-            4. Be clear about next steps
-            5. Keep technical accuracy
-            6. Preserve important details
-            
-            RESPONSE STRUCTURE:
-            1. Acknowledge the query/concern
-            2. Provide clear information/solution
-            3. Add empathetic touch
-            4. Include next steps if any
-            5. Invite further questions
-            
-            Transform the input while maintaining all factual information."""),
-            ("human", "{input}")
-        ])
+RESPONSE STRUCTURE:
+1. Acknowledge the query/concern
+2. Provide clear information/solution
+3. Add empathetic touch
+4. Include next steps if any
+5. Invite further questions"""
+
+async def personality_agent(state: AgentState) -> AgentState:
+    """Personality agent that records the styled response and builds the final output.
 
-        # Initialize personality config
-        if "personality_config" not in state:
-            state["personality_config"] = {
-                "style": "professional",
-                "tone": "friendly",
-                "language_level": "clear"
-            }
+    The personality guidelines are applied by the upstream agent's own LLM call,
+    so no additional LLM request is made here.
+    """
+    timestamp = now_str()
+    try:
+        # Initialize shared state, including the personality config
+        ensure_state(state)
         
         # Get original response
         original_response = ""
@@ -63,29 +47,19 @@ def personality_agent(state: AgentState) -> AgentState:
             if isinstance(last_message, AIMessage):
                 original_response = last_message.content
 
-        # Transform response
+        # The upstream agent already applied the personality guidelines
         personality_response = original_response
-        if original_response:
-            chain = personality_prompt | llm
-            result = chain.invoke({"input": original_response})
-            personality_response = result.content
 
-        # Update tool usage with personality LLM call
-        if original_response:
-            state["tool_outputs"]["personality_llm"] = [{
-                "input": original_response,
-                "output": personality_response,
-                "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            }]
-        
-        # Track this transformation in workflow history
+        # Record the step; the response passes through unchanged
         state["workflow_history"].append({
             "agent_name": "personality",
-            "action": "enhance_response",
+            "action": "finalize_response",
+            "pass_through": True,
             "input": original_response,
             "output": personality_response,
-            "tool_calls": state.get("tool_outputs", {}),
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            # Snapshot: the per-tool outputs are ring buffers that keep changing
+            "tool_calls": snapshot(state.get("tool_outputs", {})),
+            "timestamp": timestamp
         })
         
         # Use the complete workflow history
@@ -101,25 +75,17 @@ def personality_agent(state: AgentState) -> AgentState:
             "error": state.get("error")
         }
         
-        # Update state
-        state["messages"].append(AIMessage(content=personality_response))
+        # Update state; the upstream agent normally appended this exact answer already,
+        # and a duplicate would leak into the router cache key and every forwarded prompt
+        messages = state["messages"]
+        if not (messages and isinstance(messages[-1], AIMessage) and messages[-1].content == personality_response):
+            messages.append(AIMessage(content=personality_response))
         state["personality_output"] = final_output
         
         # Update agent stack
         state["current_agent"] = "personality"
-        if "agent_stack" not in state:
-            state["agent_stack"] = []
         state["agent_stack"].append("personality")
         
-        # Update workflow history
-        state["workflow_history"].append({
-            "agent_name": "personality",
-            "action": "enhance_response",
-            "input": original_response,
-            "output": personality_response,
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        })
-        
         return final_output
 
     except Exception as e:
@@ -1,10 +1,17 @@
+import os
+import re
+from collections import deque
 from typing import Dict, Optional
-from datetime import datetime
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
-from state import AgentState
+from state import AgentState, ensure_state
 from langgraph.graph import END
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.runnables import RunnableConfig
 from langchain_groq import ChatGroq
+from clients import HTTP_CLIENT, HTTP_ASYNC_CLIENT
+from cache import LLMCache
+from agents._time import now_str
+from agents.history import trim_history
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -12,128 +19,171 @@ load_dotenv()
 # Initialize router LLM with consistent settings
 llm = ChatGroq(
     model="meta-llama/llama-4-maverick-17b-128e-instruct",
-    temperature=0
+    temperature=0,
+    http_client=HTTP_CLIENT,
+    http_async_client=HTTP_ASYNC_CLIENT
 )
 
-def route_message(state: AgentState) -> AgentState:
-    """Router agent that determines which agent should handle the message."""
-    router_prompt = ChatPromptTemplate.from_messages([
-        ("system", """You are a routing agent that analyzes user messages and determines the best agent to handle them.
-        
-        Available agents and their responsibilities:
-        
-        1. Knowledge Agent (knowledge):
-           - Provides general information about InfinitePay and its services
-           - Answers questions about product features and capabilities
-           - Handles general inquiries not related to specific issues or problems
-           - Uses company website content and web search for accurate information
-           
-        2. Customer Support Agent (support):
-           - Handles technical issues and error reports
-           - Manages payment-related problems
-           - Processes refund requests
-           - Creates and manages support tickets
-           - Schedules support calls
-           - Provides FAQ information for common issues
-           - Assists with account-specific problems
-         
-        Instructions:
-        1. Analyze the user's message carefully
-        2. Return ONLY ONE of these exact strings: knowledge or support or end
-        3. Do not provide any additional information or explanations
-        4. If the message is unclear, ask clarifying questions to determine the best agent
-        5. If you do not know where to route, choose support
-        6. Check agent outcome and if successful, move to next task in list or end
-        7. If get anything that is non meaning full, return end
-         
-        Examples:
-        - "What services does InfinitePay offer?" → knowledge
-        - "My payment isn't going through" → support
-        - "How do I integrate the API?" → knowledge
-        - "I need help with an error" → support
-        - "How much does a card terminal cost?" → knowledge
-        - "I want to schedule a support call" → support
-        - "Goodbye" → end
-        - "That's all I needed" → end"""),
-        MessagesPlaceholder(variable_name="messages"),
-        ("human", "{input}")
-    ])
+# Routing decisions are deterministic at temperature 0, so repeat prompts are served from memory
+router_cache = LLMCache(maxsize=int(os.getenv("ROUTER_CACHE_SIZE", "256")))
+
+# Number of router LLM calls kept in tool_outputs["router_llm"]["calls"]
+ROUTER_CALL_HISTORY = 64
+
+# Keyword patterns taken from the router prompt's own examples
+_SUPPORT_KEYWORDS = ["error", "refund", "payment", "ticket", "schedule", "call", "not working", "issue", "problem"]
+_KNOWLEDGE_KEYWORDS = ["how much", "what services", "api", "integrate", "features", "pricing"]
+_SUPPORT_RE = re.compile(r"\b(" + "|".join(map(re.escape, _SUPPORT_KEYWORDS)) + r")\b", re.IGNORECASE)
+_KNOWLEDGE_RE = re.compile(r"\b(" + "|".join(map(re.escape, _KNOWLEDGE_KEYWORDS)) + r")\b", re.IGNORECASE)
+
+# Commands that end the conversation and the agents the router may hand off to
+_END_COMMANDS = frozenset({"goodbye", "bye", "exit", "quit", "end"})
+_ROUTABLE_AGENTS = frozenset({"knowledge", "support"})
+_VALID_NEXT = _ROUTABLE_AGENTS | {END}
+
+def _fast_route(user_input: str) -> Optional[str]:
+    """Route on keyword hits alone when the input is unambiguous.
+
+    Returns:
+        "support" or "knowledge" when one side has at least two distinct keyword hits
+        and leads the other by two or more, otherwise None so the LLM decides
+    """
+    support_hits = len({hit.lower() for hit in _SUPPORT_RE.findall(user_input)})
+    knowledge_hits = len({hit.lower() for hit in _KNOWLEDGE_RE.findall(user_input)})
+    if support_hits >= 2 and support_hits - knowledge_hits >= 2:
+        return "support"
+    if knowledge_hits >= 2 and knowledge_hits - support_hits >= 2:
+        return "knowledge"
+    return None
+
+# The system prompt is fixed text and comes first; per-turn history and input are
+# appended after it, so the prompt prefix stays byte-identical across turns
+_ROUTER_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", """You are a routing agent that analyzes user messages and determines the best agent to handle them.
     
+    Available agents and their responsibilities:
+    
+    1. Knowledge Agent (knowledge):
+       - Provides general information about InfinitePay and its services
+       - Answers questions about product features and capabilities
+       - Handles general inquiries not related to specific issues or problems
+       - Uses company website content and web search for accurate information
+       
+    2. Customer Support Agent (support):
+       - Handles technical issues and error reports
+       - Manages payment-related problems
+       - Processes refund requests
+       - Creates and manages support tickets
+       - Schedules support calls
+       - Provides FAQ information for common issues
+       - Assists with account-specific problems
+     
+    Instructions:
+    1. Analyze the user's message carefully
+    2. Return ONLY ONE of these exact strings: knowledge or support or end
+    3. Do not provide any additional information or explanations
+    4. If the message is unclear, ask clarifying questions to determine the best agent
+    5. If you do not know where to route, choose support
+    6. Check agent outcome and if successful, move to next task in list or end
+    7. If get anything that is non meaning full, return end
+     
+    Examples:
+    - "What services does InfinitePay offer?" → knowledge
+    - "My payment isn't going through" → support
+    - "How do I integrate the API?" → knowledge
+    - "I need help with an error" → support
+    - "How much does a card terminal cost?" → knowledge
+    - "I want to schedule a support call" → support
+    - "Goodbye" → end
+    - "That's all I needed" → end"""),
+    MessagesPlaceholder(variable_name="messages"),
+    ("human", "{input}")
+])
+_ROUTER_CHAIN = _ROUTER_PROMPT | llm
+
+async def route_message(state: AgentState, config: Optional[RunnableConfig] = None) -> AgentState:
+    """Router agent that determines which agent should handle the message."""
+    timestamp = now_str()
     try:
-        # Initialize and update state
+        # Initialize and update state, including conversation state if not present
+        ensure_state(state)
         state["current_agent"] = "router"
-        if "agent_stack" not in state:
-            state["agent_stack"] = []
         state["agent_stack"].append("router")
-        
-        # Initialize conversation state if not present
-        if "conversation_active" not in state:
-            state["conversation_active"] = True
-        if "needs_followup" not in state:
-            state["needs_followup"] = True
-        if "task_list" not in state:
-            state["task_list"] = []
-        if "workflow_history" not in state:
-            state["workflow_history"] = []
-        if "tool_outputs" not in state:
-            state["tool_outputs"] = {}            # Track start of routing in workflow history
-        state["workflow_history"].append({
-            "agent_name": "router",
-            "action": "start_routing",
-            "input": state.get("input", ""),
-            "tool_calls": {
-                "router_llm": {
-                    "calls": [],
-                    "model": "meta-llama/llama-4-maverick-17b-128e-instruct",
-                    "status": "initialized"
-                }
-            },
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        })
             
         # Check for explicit end command
-        if state.get("input", "").lower() in ["goodbye", "bye", "exit", "quit", "end"]:
+        if state.get("input", "").lower() in _END_COMMANDS:
             state["conversation_active"] = False
             state["next"] = END  # Use END constant instead of string
             return state
 
-        # Get routing decision from LLM
-        chain = router_prompt | llm
-        response = chain.invoke({
-            "messages": state["messages"],
-            "input": state["input"]
-        })
-
-        # Clean and validate response
-        next_agent = response.content.lower().strip()
-        
-        # Update tool usage with LLM call
+        # Initialize router LLM usage tracking
         if "router_llm" not in state["tool_outputs"]:
             state["tool_outputs"]["router_llm"] = {
-                "calls": [],
+                "calls": deque(maxlen=ROUTER_CALL_HISTORY),  # Bounded so long sessions don't grow without limit
                 "total_uses": 0,
-                "last_used": None
+                "last_used": None,
+                "model": "meta-llama/llama-4-maverick-17b-128e-instruct"
             }
+        # One shared tool_calls view, referenced by both routing history records
+        router_tool_calls = {"router_llm": state["tool_outputs"]["router_llm"]}
+        if "router_fast_path" not in state["tool_outputs"]:
+            state["tool_outputs"]["router_fast_path"] = {"fast_path": 0, "llm": 0}
+
+        # Try the keyword fast path before paying for an LLM round trip
+        next_agent = _fast_route(state["input"])
+        if next_agent is not None:
+            state["tool_outputs"]["router_fast_path"]["fast_path"] += 1
+        else:
+            state["tool_outputs"]["router_fast_path"]["llm"] += 1
+
+            # Track start of routing in workflow history (only when the LLM path runs)
+            state["workflow_history"].append({
+                "agent_name": "router",
+                "action": "start_routing",
+                "input": state.get("input", ""),
+                "tool_calls": router_tool_calls,
+                "timestamp": timestamp
+            })
+
+            # Get routing decision from cache or LLM
+            cacheable = llm.temperature == 0
+            cache_key = LLMCache.make_key({
+                "messages": [message.content for message in state["messages"]],
+                "input": state["input"]
+            })
+            next_agent = router_cache.get(cache_key) if cacheable else None
+            cache_hit = next_agent is not None
+            if not cache_hit:
+                response = await _ROUTER_CHAIN.ainvoke({
+                    "messages": trim_history(state),
+                    "input": state["input"]
+                }, config=config)
+
+                # Clean and validate response
+                next_agent = response.content.lower().strip()
+                if cacheable:
+                    router_cache.set(cache_key, next_agent)
+                
+            # Add new call to history
+            completed_at = now_str()
+            state["tool_outputs"]["router_llm"]["calls"].append({
+                "input": state["input"],
+                "output": next_agent,
+                "model": "meta-llama/llama-4-maverick-17b-128e-instruct",
+                "status": "cache_hit" if cache_hit else "success",
+                "timestamp": completed_at
+            })
             
-        # Add new call to history
-        state["tool_outputs"]["router_llm"]["calls"].append({
-            "input": state["input"],
-            "output": next_agent,
-            "model": "meta-llama/llama-4-maverick-17b-128e-instruct",
-            "status": "success",
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        })
-        
-        # Update tool usage stats
-        state["tool_outputs"]["router_llm"]["total_uses"] += 1
-        state["tool_outputs"]["router_llm"]["last_used"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            # Update tool usage stats
+            state["tool_outputs"]["router_llm"]["total_uses"] += 1
+            state["tool_outputs"]["router_llm"]["last_used"] = completed_at
         
         # Convert string responses to proper states
         if next_agent == "end":
             next_agent = END
             state["conversation_active"] = False
             state["needs_followup"] = False
-        elif next_agent not in ["knowledge", "support"]:
+        elif next_agent not in _ROUTABLE_AGENTS:
             print(f"Unexpected response from router: {next_agent}, defaulting to support")
             next_agent = "support"
             
@@ -143,16 +193,8 @@ def route_message(state: AgentState) -> AgentState:
             "action": "complete_routing",
             "input": state["input"],
             "output": next_agent,
-            "tool_calls": {
-                "router_llm": {
-                    "calls": state["tool_outputs"]["router_llm"]["calls"],
-                    "total_uses": state["tool_outputs"]["router_llm"]["total_uses"],
-                    "last_used": state["tool_outputs"]["router_llm"]["last_used"],
-                    "model": "meta-llama/llama-4-maverick-17b-128e-instruct",
-                    "status": "success"
-                }
-            },
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            "tool_calls": router_tool_calls,
+            "timestamp": now_str()
         })
         
         # Handle conversation state and agent outcomes
@@ -176,7 +218,7 @@ def route_message(state: AgentState) -> AgentState:
             if next_agent == "end":
                 next_agent = END
                 
-        if next_agent not in ["knowledge", "support", END]:
+        if next_agent not in _VALID_NEXT:
             print(f"Invalid router response '{next_agent}', defaulting to support")
             next_agent = "support"
 
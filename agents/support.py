@@ -1,43 +1,107 @@
 from typing import Dict, Optional, List, Any
-from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
-from state import AgentState
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.messages import HumanMessage, AIMessage
+from state import AgentState, ensure_state
+from langchain_core.prompts import PromptTemplate
+from langchain_core.runnables import RunnableConfig
 from langchain_groq import ChatGroq
+from clients import HTTP_CLIENT, HTTP_ASYNC_CLIENT
 from langchain.agents import AgentExecutor, create_react_agent
 from langchain import hub
 from tools import create_support_ticket, schedule_support_call
-import json
-from datetime import datetime
+from agents.personality import PERSONALITY_GUIDELINES
+from agents._time import now_str
+import re
+import orjson
+from pathlib import Path
+from functools import lru_cache
 from dotenv import load_dotenv
 
 load_dotenv()
 
 llm = ChatGroq(
     model="meta-llama/llama-4-maverick-17b-128e-instruct",
-    temperature=0
+    temperature=0,
+    http_client=HTTP_CLIENT,
+    http_async_client=HTTP_ASYNC_CLIENT
 )
 
+_TOOLS = [create_support_ticket, schedule_support_call]
+
+_SUPPORT_SYSTEM_PROMPT = """You are a professional customer support agent for InfinitePay.
+
+AVAILABLE TOOLS:
+1. create_support_ticket: Create support tickets
+   Required: issue description
+   Optional: priority (low/normal/high/urgent), category
+   
+2. schedule_support_call: Schedule support calls
+   Required: issue summary, preferred date (YYYY-MM-DD), preferred time (HH:MM) in format in string only
+   
+BUSINESS RULES:
+- Support calls available Monday-Friday, 9 AM - 5 PM only
+- Verify all required fields are present before scheduling
+- Always validate date and time formats
+
+GUIDELINES:
+1. Be professional and empathetic
+2. Gather all required information
+3. Confirm understanding before taking action
+4. Provide clear next steps
+5. Follow up after actions
+6. date and time formats: YYYY-MM-DD for date, HH:MM for time and str format
+
+""" + PERSONALITY_GUIDELINES
+
+@lru_cache(maxsize=1)
+def get_support_executor() -> AgentExecutor:
+    """Build the support ReAct executor once; hub.pull is a network round trip.
+
+    The API lifespan warms this before serving, so agent calls read the cached executor.
+    """
+    react_prompt = hub.pull("hwchase17/react")
+    prompt = PromptTemplate.from_template(f"{_SUPPORT_SYSTEM_PROMPT}\n\n{react_prompt.template}")
+    agent_with_tools = create_react_agent(
+        llm=llm,
+        tools=_TOOLS,
+        prompt=prompt
+    )
+    return AgentExecutor(
+        agent=agent_with_tools,
+        tools=_TOOLS,
+        verbose=False,
+        handle_parsing_errors=True
+    )
+
+# Phrases showing the response already offers further help
+_FOLLOWUP_PHRASES = ("anything else", "other questions", "can i help", "need clarification", "is there anything")
+
+# Keywords that signal a call-scheduling request, matched as substrings in one regex scan
+_CALL_KEYWORDS = [
+    "call", "schedule", "appointment", "meeting", "talk",
+    "discuss", "phone", "speak", "consultation", "demo",
+    "training", "walkthrough", "setup"
+]
+_CALL_RE = re.compile("|".join(map(re.escape, _CALL_KEYWORDS)), re.IGNORECASE)
+
+@lru_cache(maxsize=None)
+def _load_customer_template(json_file: str) -> Dict[str, Any]:
+    """Load and parse a customer data template once per process; the files never change at runtime."""
+    return orjson.loads(Path(json_file).read_bytes())
+
 def process_customer_data(user_input: str) -> Dict[str, Any]:
     """Process and validate customer request data."""
     # Determine intent from user input
-    call_keywords = [
-        "call", "schedule", "appointment", "meeting", "talk", 
-        "discuss", "phone", "speak", "consultation", "demo",
-        "training", "walkthrough", "setup"
-    ]
-    
-    intent = "schedule_call" if any(keyword in user_input.lower() for keyword in call_keywords) else "create_ticket"
+    intent = "schedule_call" if _CALL_RE.search(user_input) is not None else "create_ticket"
     
     # Load appropriate template based on intent
     json_file = "two.json" if intent == "schedule_call" else "one.json"
     try:
-        with open(json_file, 'r') as file:
-            customer_data = json.load(file)
-            return {
-                "intent": intent,
-                "data": customer_data,
-                "error": None
-            }
+        customer_data = _load_customer_template(json_file)
+        return {
+            "intent": intent,
+            "data": customer_data,
+            "error": None
+        }
     except Exception as e:
         return {
             "intent": intent,
@@ -45,32 +109,19 @@ def process_customer_data(user_input: str) -> Dict[str, Any]:
             "error": f"Error loading customer data: {str(e)}"
         }
 
-def customer_support_agent(state: AgentState) -> AgentState:
+async def customer_support_agent(state: AgentState, config: RunnableConfig) -> AgentState:
     """Customer support agent that handles tickets and appointments."""
     # Initialize and update state
+    ensure_state(state)
     state["current_agent"] = "support"
-    if "agent_stack" not in state:
-        state["agent_stack"] = []
     state["agent_stack"].append("support")
-    
-    # Initialize tool tracking state
-    if "tool_outputs" not in state:
-        state["tool_outputs"] = {}
-    if "workflow_history" not in state:
-        state["workflow_history"] = []
-    if "support_context" not in state:
-        state["support_context"] = {
-            "current_ticket": None,
-            "current_appointment": None,
-            "interaction_history": []
-        }
         
     # Track support agent activation in workflow
     state["workflow_history"].append({
         "agent_name": "support",
         "action": "handle_request",
         "input": state["input"],
-        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        "timestamp": now_str()
     })
 
     # Process customer data
@@ -84,56 +135,6 @@ def customer_support_agent(state: AgentState) -> AgentState:
         ))
         return state
 
-    # Set up tools
-    tools = [create_support_ticket, schedule_support_call]
-
-    # Create agent prompt
-    support_prompt = ChatPromptTemplate.from_messages([
-        ("system", f"""You are a professional customer support agent for InfinitePay.
-
-        AVAILABLE TOOLS:
-        1. create_support_ticket: Create support tickets
-           Required: issue description
-           Optional: priority (low/normal/high/urgent), category
-           
-        2. schedule_support_call: Schedule support calls
-           Required: issue summary, preferred date (YYYY-MM-DD), preferred time (HH:MM) in format in string only
-           
-        BUSINESS RULES:
-        - Support calls available Monday-Friday, 9 AM - 5 PM only
-        - Verify all required fields are present before scheduling
-        - Always validate date and time formats
-        
-        GUIDELINES:
-        1. Be professional and empathetic
-        2. Gather all required information
-        3. Confirm understanding before taking action
-        4. Provide clear next steps
-        5. Follow up after actions
-         6. date and time formats: YYYY-MM-DD for date, HH:MM for time and str format
-        
-        Current Customer Data: {process_result['data']}
-        Current Intent: {process_result['intent']}"""),
-        MessagesPlaceholder(variable_name="messages"),
-        ("human", "{input}")
-    ])
-
-    # Create and configure the agent
-    prompt = hub.pull("hwchase17/react")
-    agent_with_tools = create_react_agent(
-        llm=llm,
-        tools=tools,
-        prompt=prompt
-    )
-
-    # Create the executor
-    agent_executor = AgentExecutor(
-        agent=agent_with_tools, 
-        tools=tools,
-        verbose=True,
-        handle_parsing_errors=True
-    )
-
     try:
         # Prepare input based on intent
         if process_result["intent"] == "create_ticket":
@@ -172,25 +173,28 @@ def customer_support_agent(state: AgentState) -> AgentState:
                 f'"general")'
             )
 
+        # Append the per-request customer context to the input
+        tool_input = (
+            f"{tool_input}\n\n"
+            f"Current Customer Data: {process_result['data']}\n"
+            f"Current Intent: {process_result['intent']}"
+        )
+
         # Execute agent
-        response = agent_executor.invoke({
-            "input": tool_input,
-            "chat_history": [system_message for system_message in state["messages"] 
-                           if isinstance(system_message, SystemMessage)]
-        })
+        agent_executor = get_support_executor()
+        response = await agent_executor.ainvoke({"input": tool_input}, config=config)
         
         # Track tool usage
         state["workflow_history"].append({
             "agent_name": "support",
-            "tool_calls": state.get("tool_usage", [])
+            # A list snapshot of the ring buffer, as it was after this turn
+            "tool_calls": list(state.get("tool_usage", ()))
         })
         
         # Format response
         response_content = response["output"]
-        if not any(phrase in response_content.lower() for phrase in [
-            "anything else", "other questions", "can i help",
-            "need clarification", "is there anything"
-        ]):
+        response_lower = response_content.lower()
+        if not any(phrase in response_lower for phrase in _FOLLOWUP_PHRASES):
             response_content += "\n\nIs there anything else I can help you with?"
         
         # Update state
@@ -218,7 +222,7 @@ def customer_support_agent(state: AgentState) -> AgentState:
             "agent_name": "support",
             "action": "error_handling",
             "error": error_message,
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            "timestamp": now_str()
         })
         
         # Clear any partial tool outputs
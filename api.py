@@ -1,63 +1,88 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel, Field, validator
-from typing import Dict, Any, List
-from graph import invoke_graph
+from typing import Dict, Any, Iterable
+from clients import aclose_async_pool
+from graph import ainvoke_graph, astream_graph
+from agents.support import get_support_executor
+from rag import get_rag_manager
+from schemas import ChatRequest, ChatResponse
+from state import snapshot
+from tools import start_audit_log, stop_audit_log
+import orjson
 import uvicorn
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Load the embeddings model, FAISS vector store and support executor before serving requests."""
+    start_audit_log()
+    app.state.rag, _ = await asyncio.gather(
+        asyncio.to_thread(get_rag_manager),
+        asyncio.to_thread(get_support_executor)
+    )
+    yield
+    # Close this loop's pooled LLM connections, the embedding worker and the audit log
+    await aclose_async_pool()
+    await asyncio.to_thread(app.state.rag.close)
+    stop_audit_log()
+
+# Cap concurrent agent workflows per worker so bursts queue instead of piling up LLM calls
+MAX_CONCURRENT_CHATS = int(os.getenv("MAX_CONCURRENT_CHATS", "32"))
+_chat_slots = asyncio.Semaphore(MAX_CONCURRENT_CHATS)
 
 app = FastAPI(
     title="Agent Swarm API",
     description="API for interacting with the agent swarm implementation",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
+# Allowed frontend origins, comma separated (the Streamlit dashboard by default)
+CORS_ORIGINS = [origin.strip() for origin in os.getenv("CORS_ORIGINS", "http://localhost:8501").split(",") if origin.strip()]
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],  # Allows all origins
+    allow_origins=CORS_ORIGINS,
     allow_credentials=True,
-    allow_methods=["*"],  # Allows all methods
-    allow_headers=["*"],  # Allows all headers
+    allow_methods=["GET", "POST"],
+    allow_headers=["Content-Type"],
 )
 
-class ChatRequest(BaseModel):
-    message: str = Field(..., min_length=1, max_length=4000, description="The message to process. Must contain either 'dev' or '123456' and cannot be only numbers")
-    user_id: str = Field(..., min_length=1, max_length=100, description="Unique identifier for the user")
+class SelectiveGZipMiddleware:
+    """GZipMiddleware that passes the listed paths through uncompressed.
 
-    @validator('message')
-    def validate_message(cls, v):
-        if v.strip() == "":
-            raise ValueError("Message cannot be empty or just whitespace")
-        
-        # Check if message contains only numbers
-        if v.strip().replace(" ", "").isdigit():
-            raise ValueError("Message cannot contain only numbers")
-        
-      
-            
-        return v.strip()
-
-    @validator('user_id')
-    def validate_user_id(cls, v):
-        if not v.strip():
-            raise ValueError("User ID cannot be empty or just whitespace")
-        return v.strip()
-
-class ChatResponse(BaseModel):
-    response: str = Field(..., description="The main response from the agent system")
-    source_agent_response: str = Field(..., description="Response from the source agent")
-    agent_workflow: List[Dict[str, Any]] = Field(default_factory=list, description="List of agent workflow steps")
-    conversation_active: bool = Field(default=True, description="Whether the conversation is still active")
-    needs_followup: bool = Field(default=True, description="Whether the conversation needs follow-up")
-    error: str | None = Field(default=None, description="Error message if any")
-
-    @validator('response', 'source_agent_response')
-    def validate_responses(cls, v):
-        if not v or not v.strip():
-            raise ValueError("Response cannot be empty")
-        return v
-
-@app.post("/chat", response_model=ChatResponse)
+    GZip buffers the body until a compressed block is ready, which would hold back
+    the tokens of a streaming response.
+    """
+
+    def __init__(self, app: ASGIApp, exclude_paths: Iterable[str] = (), **options: Any) -> None:
+        self.app = app
+        self.gzip = GZipMiddleware(app, **options)
+        self.exclude_paths = frozenset(exclude_paths)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http" and scope["path"] in self.exclude_paths:
+            await self.app(scope, receive, send)
+        else:
+            await self.gzip(scope, receive, send)
+
+# Compress JSON bodies over 1 KB (agent_workflow and long answers), but not the token stream
+app.add_middleware(
+    SelectiveGZipMiddleware,
+    exclude_paths=("/chat/stream",),
+    minimum_size=1024,
+    compresslevel=5
+)
+
+@app.post("/chat", response_model=ChatResponse, response_class=ORJSONResponse)
 async def chat_endpoint(request: ChatRequest) -> Dict[str, Any]:
     """Process a chat message through the agent system.
     
@@ -72,7 +97,8 @@ async def chat_endpoint(request: ChatRequest) -> Dict[str, Any]:
     """
     try:
         # Process message through agent workflow
-        result = invoke_graph(request.message)
+        async with _chat_slots:
+            result = await ainvoke_graph(request.message)
         
         # Validate and format response
         if not isinstance(result, dict):
@@ -85,7 +111,8 @@ async def chat_endpoint(request: ChatRequest) -> Dict[str, Any]:
         return ChatResponse(
             response=result.get("response", ""),
             source_agent_response=result.get("source_agent_response", ""),
-            agent_workflow=result.get("agent_workflow", []),
+            # Workflow steps reference the live router/tool histories, which are deques
+            agent_workflow=snapshot(result.get("agent_workflow", [])),
             conversation_active=result.get("conversation_active", True),
             needs_followup=result.get("needs_followup", True),
             error=result.get("error")
@@ -102,10 +129,45 @@ async def chat_endpoint(request: ChatRequest) -> Dict[str, Any]:
             detail=f"Internal server error: {str(e)}"
         )
 
+_ORJSON_OPTIONS = orjson.OPT_APPEND_NEWLINE | orjson.OPT_NAIVE_UTC | orjson.OPT_SERIALIZE_NUMPY
+
+def dump_event(event: Dict[str, Any]) -> bytes:
+    """Serialize one stream event as an NDJSON line, falling back to FastAPI's encoder for non-native types."""
+    return orjson.dumps(event, default=jsonable_encoder, option=_ORJSON_OPTIONS)
+
+@app.post("/chat/stream")
+async def chat_stream_endpoint(request: ChatRequest) -> StreamingResponse:
+    """Stream a chat response through the agent system as newline-delimited JSON.
+    
+    Args:
+        request: ChatRequest containing message and user_id
+        
+    Returns:
+        StreamingResponse emitting {"type": "token"} lines while the answer is generated,
+        followed by one {"type": "final"} line with the same fields as /chat
+    """
+    async def event_lines():
+        try:
+            async with _chat_slots:
+                async for event in astream_graph(request.message):
+                    yield dump_event(event)
+        except Exception as e:
+            yield dump_event({"type": "error", "detail": f"Internal server error: {str(e)}"})
+
+    return StreamingResponse(event_lines(), media_type="application/x-ndjson")
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
     return {"status": "healthy"}
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    uvicorn.run(
+        "api:app",
+        host="0.0.0.0",
+        port=8000,
+        loop="uvloop",
+        http="httptools",
+        workers=int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1)),
+        log_level="warning"
+    )
\ No newline at end of file
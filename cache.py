@@ -0,0 +1,118 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional
+
+import numpy as np
+
+
+class LLMCache:
+    """Thread-safe LRU cache for deterministic (temperature=0) LLM responses and retrieval results."""
+
+    def __init__(self, maxsize: int = 256):
+        """Initialize the cache.
+
+        Args:
+            maxsize: Maximum number of entries kept before the least recently used is evicted
+        """
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(payload: Dict[str, Any]) -> str:
+        """Build a stable cache key from a JSON-serializable prompt payload."""
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return the cached value for key, or None on a miss."""
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """Store value under key, evicting the least recently used entry if full."""
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Drop every cached entry."""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SemanticCache:
+    """Thread-safe cache that answers near-duplicate queries by embedding similarity.
+
+    Embeddings are kept row-wise in one preallocated matrix, so a lookup is a single
+    matrix-vector product. The oldest entry is overwritten once maxsize is reached;
+    at the default size a linear scan is cheaper than maintaining an LSH index.
+    """
+
+    def __init__(self, threshold: float = 0.95, maxsize: int = 1024):
+        """Initialize the cache.
+
+        Args:
+            threshold: Minimum cosine similarity for a cached answer to be returned
+            maxsize: Maximum number of entries kept before the oldest is overwritten
+        """
+        self.threshold = threshold
+        self.maxsize = maxsize
+        self._vectors: Optional[np.ndarray] = None
+        self._values: List[Any] = []
+        self._next = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(vector: Any) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32).ravel()
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def get(self, vector: Any) -> Optional[Any]:
+        """Return the value of the most similar cached embedding, or None below the threshold."""
+        query = self._normalize(vector)
+        with self._lock:
+            if not self._values:
+                return None
+            similarities = self._vectors[:len(self._values)] @ query
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                return None
+            return self._values[best]
+
+    def set(self, vector: Any, value: Any) -> None:
+        """Store value under an embedding, overwriting the oldest entry if full."""
+        if self.maxsize <= 0:
+            return
+        row = self._normalize(vector)
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.zeros((self.maxsize, row.shape[0]), dtype=np.float32)
+            self._vectors[self._next] = row
+            if len(self._values) < self.maxsize:
+                self._values.append(value)
+            else:
+                self._values[self._next] = value
+            self._next = (self._next + 1) % self.maxsize
+
+    def clear(self) -> None:
+        """Drop every cached entry."""
+        with self._lock:
+            self._vectors = None
+            self._values = []
+            self._next = 0
+
+    def __len__(self) -> int:
+        return len(self._values)
@@ -0,0 +1,59 @@
+"""HTTP connection pools shared by every outbound LLM client."""
+import asyncio
+import atexit
+import weakref
+import httpx
+
+# Keep-alive pools so Groq calls from all agents reuse TLS connections instead of
+# opening a new one per request
+HTTP_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=20)
+HTTP_TIMEOUT = httpx.Timeout(30.0)
+
+
+class PerLoopTransport(httpx.AsyncBaseTransport):
+    """Async transport keeping one connection pool per event loop.
+
+    Pooled connections are bound to the loop that opened them, and the LLM clients
+    share one AsyncClient across the server loop, graph.invoke_graph's loop and test
+    loops. Each loop gets its own pool; a pool is dropped with its loop or closed by
+    aclose_async_pool().
+    """
+
+    def __init__(self, limits: httpx.Limits = HTTP_LIMITS):
+        self.limits = limits
+        self._pools: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncHTTPTransport]" = (
+            weakref.WeakKeyDictionary()
+        )
+
+    def _pool(self) -> httpx.AsyncHTTPTransport:
+        loop = asyncio.get_running_loop()
+        pool = self._pools.get(loop)
+        if pool is None:
+            pool = self._pools[loop] = httpx.AsyncHTTPTransport(limits=self.limits)
+        return pool
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        return await self._pool().handle_async_request(request)
+
+    async def aclose(self) -> None:
+        """Close the running loop's pool; the next request on this loop opens a new one."""
+        pool = self._pools.pop(asyncio.get_running_loop(), None)
+        if pool is not None:
+            await pool.aclose()
+
+
+_ASYNC_TRANSPORT = PerLoopTransport()
+
+HTTP_CLIENT = httpx.Client(limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT)
+HTTP_ASYNC_CLIENT = httpx.AsyncClient(transport=_ASYNC_TRANSPORT, timeout=HTTP_TIMEOUT)
+
+atexit.register(HTTP_CLIENT.close)
+
+
+async def aclose_async_pool() -> None:
+    """Close the running loop's async connections, e.g. on app shutdown.
+
+    Unlike HTTP_ASYNC_CLIENT.aclose() this leaves the shared client usable, so a later
+    loop (another lifespan, a test) can still send requests through it.
+    """
+    await _ASYNC_TRANSPORT.aclose()
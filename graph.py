@@ -1,7 +1,68 @@
-from typing import Dict
+import asyncio
+import atexit
+import logging
+import os
+import re
+from functools import lru_cache
+from types import MappingProxyType
+from typing import AsyncIterator, Dict, Optional
+from langchain_core.runnables import RunnableConfig
 from langgraph.graph import Graph, END
-from state import AgentState
-from agents import route_message, knowledge_agent, customer_support_agent, personality_agent
+from state import AgentState, InitialAgentState
+from agents.history import trim_history
+from agents import route_message, knowledge_agent, run_knowledge_query, customer_support_agent, personality_agent
+from agents.knowledge import FINAL_ANSWER_TAG
+
+logger = logging.getLogger(__name__)
+
+# Start the knowledge agent's work alongside the router so its latency hides the routing call
+SPECULATE_KNOWLEDGE = os.getenv("SPECULATE_KNOWLEDGE", "true").lower() == "true"
+
+async def _speculate_knowledge(state: AgentState, user_input: str, config: RunnableConfig):
+    """Trim the history and run the knowledge query, all inside the speculative task."""
+    return await run_knowledge_query(user_input, trim_history(state), config)
+
+async def speculative_router(state: AgentState, config: RunnableConfig) -> AgentState:
+    """Route the message while speculatively running the knowledge query in parallel.
+
+    The speculative result is handed to the knowledge agent when the router picks it,
+    otherwise it is cancelled. The node's config is forwarded so the speculative run's
+    callbacks (and its streamed answer tokens) reach the graph's event stream.
+    """
+    if not SPECULATE_KNOWLEDGE:
+        return await route_message(state, config)
+
+    speculative_input = state.get("input", "")
+    task = asyncio.create_task(_speculate_knowledge(state, speculative_input, config))
+    state = await route_message(state, config)
+
+    stats = state.setdefault("tool_outputs", {}).setdefault("speculation", {"hits": 0, "misses": 0})
+    if state.get("next") == "knowledge" and not state.get("error"):
+        stats["hits"] += 1
+        state["speculative_knowledge"] = {"input": speculative_input, "task": task}
+    else:
+        stats["misses"] += 1
+        task.cancel()
+    return state
+
+# End indicators for natural conversation endings, matched in one case-insensitive pass
+_END_INDICATORS = (
+    "goodbye",
+    "thank you",
+    "thanks",
+    "have a good day",
+    "that's all",
+    "ticket has been created",
+    "appointment has been scheduled"
+)
+_END_RE = re.compile("|".join(re.escape(indicator) for indicator in _END_INDICATORS), re.IGNORECASE)
+
+# Valid route_edge targets, built once instead of per call
+_END_ROUTES = frozenset({"end", "__end__", END})
+_AGENT_ROUTES = frozenset({"knowledge", "support", "router"})
+
+# Graph node names; astream_graph takes the final state from the last of these to finish
+_GRAPH_NODES = frozenset({"router", "knowledge", "support", "personality"})
 
 def should_continue(state: AgentState) -> str:
     """
@@ -11,25 +72,14 @@ def should_continue(state: AgentState) -> str:
     """
     # Check for error condition
     if state.get("error"):
-        print("Ending due to error condition")
+        logger.debug("Ending due to error condition")
         return END
     # Get the last message
     last_message = state["messages"][-1].content if state["messages"] else ""
 
-    # End indicators for natural conversation endings
-    end_indicators = [
-        "goodbye",
-        "thank you",
-        "thanks",
-        "have a good day",
-        "that's all",
-        "ticket has been created",
-        "appointment has been scheduled"
-    ]
-
     # Check if this is the end of the conversation
-    if any(indicator in last_message.lower() for indicator in end_indicators):
-        print("Ending due to natural conversation end")
+    if _END_RE.search(last_message):
+        logger.debug("Ending due to natural conversation end")
         return END
 
     # Check if we should continue with follow-up
@@ -42,42 +92,72 @@ def should_continue(state: AgentState) -> str:
 
     return END
 
+def route_edge(state: AgentState) -> str:
+    """Route to the next agent based on the router's decision."""
+    if "messages" not in state:
+        state["messages"] = []
+
+    if state.get("error"):
+        return END
+    next_agent = state.get("next", "")
+    if not next_agent:
+        logger.debug("No next agent specified, routing to support agent by default.")
+        state["next"] = "support"
+        return "support"
+
+    next_agent = next_agent.strip().lower()
+    if next_agent in _END_ROUTES:
+        logger.debug("Routing to END state")
+        return END
+
+    logger.debug("Routing to: %s", next_agent)
+    if next_agent in _AGENT_ROUTES:
+        return next_agent
+
+    logger.debug("Invalid agent '%s', routing to support agent by default.", next_agent)
+    state["next"] = "support"
+    return "support"
+
+def personality_edge(state: AgentState) -> str:
+    """Route after personality transformation."""
+    if "messages" not in state:
+        state["messages"] = []
+
+    if state.get("error"):
+        logger.debug("Ending due to error in personality edge")
+        return END
+
+    result = should_continue(state)
+
+    if result == "router":
+        state["tool_result"] = None
+        state["last_tool"] = None
+        state["agent_outcome"] = None
+        state["current_agent"] = "router"
+    elif result == END:
+        state["knowledge_context"] = {}
+        current_history = state.get("support_context", {}).get("interaction_history", [])
+        state["support_context"] = {
+            "current_ticket": None,
+            "current_appointment": None,
+            "interaction_history": current_history
+        }
+        logger.debug("Routing back to router for follow-up")
+    else:
+        logger.debug("Ending conversation naturally")
+
+    logger.debug("Personality edge decision: %s", result)
+    return result
+
 def create_graph() -> Graph:
     """Create the workflow graph connecting the agents."""
     workflow = Graph()
     # Add nodes
-    workflow.add_node("router", route_message)
+    workflow.add_node("router", speculative_router)
     workflow.add_node("knowledge", knowledge_agent)
     workflow.add_node("support", customer_support_agent)
     workflow.add_node("personality", personality_agent)
 
-    # Router edge function (unchanged)
-    def route_edge(state: AgentState) -> str:
-        """Route to the next agent based on the router's decision."""
-        if "messages" not in state:
-            state["messages"] = []
-
-        if state.get("error"):
-            return END
-        next_agent = state.get("next", "")
-        if not next_agent:
-            print("No next agent specified, routing to support agent by default.")
-            state["next"] = "support"
-            return "support"
-
-        next_agent = next_agent.strip().lower()
-        if next_agent in ["end", "__end__", END]:
-            print("Routing to END state")
-            return END
-
-        print(f"Routing to: {next_agent}")
-        if next_agent in ["knowledge", "support", "router"]:
-            return next_agent
-
-        print(f"Invalid agent '{next_agent}', routing to support agent by default.")
-        state["next"] = "support"
-        return "support"
-
     # Add edges for router with updated mapping
     workflow.add_conditional_edges(
         "router",
@@ -95,38 +175,6 @@ def create_graph() -> Graph:
     workflow.add_edge("support", "personality")
     workflow.add_edge("personality", END)
 
-    # Define personality-edge function (unchanged)
-    def personality_edge(state: AgentState) -> str:
-        """Route after personality transformation."""
-        if "messages" not in state:
-            state["messages"] = []
-
-        if state.get("error"):
-            print("Ending due to error in personality edge")
-            return END
-
-        result = should_continue(state)
-
-        if result == "router":
-            state["tool_result"] = None
-            state["last_tool"] = None
-            state["agent_outcome"] = None
-            state["current_agent"] = "router"
-        elif result == END:
-            state["knowledge_context"] = {}
-            current_history = state.get("support_context", {}).get("interaction_history", [])
-            state["support_context"] = {
-                "current_ticket": None,
-                "current_appointment": None,
-                "interaction_history": current_history
-            }
-            print("Routing back to router for follow-up")
-        else:
-            print("Ending conversation naturally")
-
-        print(f"Personality edge decision: {result}")
-        return result
-
     # Add conditional edge from personality with updated mapping
     workflow.add_conditional_edges(
         "personality",
@@ -142,6 +190,14 @@ def create_graph() -> Graph:
 
     return workflow
 
+@lru_cache(maxsize=1)
+def get_compiled_graph():
+    """Build and compile the workflow once; the compiled graph is stateless and reused by every request.
+
+    Tests that need a fresh graph can call get_compiled_graph.cache_clear().
+    """
+    return create_graph().compile()
+
 def cleanup_state(state: AgentState) -> None:
     """Clean up the state after agent execution."""
     # Remove completed agent from stack
@@ -152,6 +208,11 @@ def cleanup_state(state: AgentState) -> None:
         else:
             state["current_agent"] = None
 
+    # A history summary still running has no later turn to serve
+    pending_summary = state.pop("history_summary_task", None)
+    if pending_summary is not None:
+        pending_summary.cancel()
+
     # Clear temporary data
     if state.get("is_complete"):
         state["knowledge_context"] = {}
@@ -164,46 +225,22 @@ def cleanup_state(state: AgentState) -> None:
     elif not state.get("task_list") and not state.get("needs_followup"):
         state["conversation_active"] = False
 
-def invoke_graph(message: str) -> Dict:
-    """Invoke the agent workflow with a message."""
-
-    # Create the initial state
-    state = {
-        # Core conversation state
-        "input": message,
-        "messages": [],
-        "next": "",
-        "error": None,
-        "agent_outcome": None,
-
-        # Tool tracking
-        "tool_outputs": {},  # Store outputs by tool name
-        "tool_usage": [],    # Track all tool calls
-        "last_tool": None,   # Last tool used
-        "tool_result": None, # Last tool result
-
-        # Workflow state
-        "workflow_history": [],  # Track agent interactions
-        "current_agent": None,   # Current active agent
-        "agent_stack": [],       # Track agent call stack
-
-        # Conversation control
-        "conversation_active": True,
-        "needs_followup": True,
-        "is_complete": False,
-        "task_list": [],         # Pending tasks
-
-        # Agent-specific states
-        "personality_output": None,
-        "knowledge_context": {},  # Store RAG context
-        "support_context": {}     # Store support interaction context
-    }
-
-    # Create and run the graph
-    workflow = create_graph()
-    app = workflow.compile()
-    result = app.invoke(state)
-
+def create_initial_state(message: str) -> AgentState:
+    """Create the initial agent state for a message."""
+    return InitialAgentState(input=message).to_state()
+
+# Immutable defaults for graph results; the list-valued fields get fresh objects per call
+_RESULT_DEFAULTS = MappingProxyType({
+    "response": "",
+    "source_agent_response": "",
+    "conversation_active": True,
+    "needs_followup": True,
+    "error": None,
+    "is_complete": False
+})
+
+def finalize_result(result: Dict, state: AgentState) -> Dict:
+    """Clean up the state and make sure the graph result has every required field."""
     # Clean up state after execution
     cleanup_state(state)
 
@@ -220,17 +257,55 @@ def invoke_graph(message: str) -> Dict:
             "is_complete": True
         }
 
-    # Add any missing required fields
-    result.setdefault("response", "")
-    result.setdefault("source_agent_response", "")
-    result.setdefault("messages", [])
-    result.setdefault("conversation_active", True)
-    result.setdefault("needs_followup", True)
-    result.setdefault("agent_workflow", state.get("workflow_history", []))
-    result.setdefault("error", None)
-    result.setdefault("is_complete", False)
+    # Add any missing required fields in a single merge
+    return {**_RESULT_DEFAULTS, "messages": [], "agent_workflow": state.get("workflow_history", []), **result}
 
-    return result
+async def ainvoke_graph(message: str) -> Dict:
+    """Invoke the agent workflow with a message on the running event loop."""
+    state = create_initial_state(message)
+
+    # Run the shared compiled graph
+    result = await get_compiled_graph().ainvoke(state)
+
+    return finalize_result(result, state)
+
+async def astream_graph(message: str) -> AsyncIterator[Dict]:
+    """Run the agent workflow, yielding answer tokens as they are generated.
+
+    Yields:
+        {"type": "token", "content": ...} for each streamed chunk of the final answer,
+        then {"type": "final", ...} with the same fields ainvoke_graph returns
+    """
+    state = create_initial_state(message)
+
+    result = None
+    async for event in get_compiled_graph().astream_events(state, version="v2"):
+        if event["event"] == "on_chat_model_stream" and FINAL_ANSWER_TAG in event.get("tags", []):
+            content = event["data"]["chunk"].content
+            if content:
+                yield {"type": "token", "content": content}
+        elif (
+            event["event"] == "on_chain_end"
+            and event["name"] in _GRAPH_NODES
+            and event.get("metadata", {}).get("langgraph_node") == event["name"]
+        ):
+            # The root run ends with the last {node: output} update chunk, not the state
+            # ainvoke returns, so keep the output of the most recent node instead
+            result = event["data"].get("output")
+
+    yield {"type": "final", **finalize_result(result, state)}
+
+# Sync callers share one event loop so the pooled async HTTP connections stay usable
+# between calls; it is created on the first invoke_graph call and closed at exit
+_sync_loop: Optional[asyncio.AbstractEventLoop] = None
+
+def invoke_graph(message: str) -> Dict:
+    """Invoke the agent workflow with a message from synchronous code."""
+    global _sync_loop
+    if _sync_loop is None:
+        _sync_loop = asyncio.new_event_loop()
+        atexit.register(_sync_loop.close)
+    return _sync_loop.run_until_complete(ainvoke_graph(message))
 
 if __name__ == "__main__":
     # Example usage
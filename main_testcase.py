@@ -1,5 +1,6 @@
 import pytest
 from fastapi.testclient import TestClient
+from collections import deque
 from unittest.mock import patch, MagicMock
 
 from api import app
@@ -17,7 +18,7 @@ def test_health_check():
 
 # ---------- Test Chat Endpoint ----------
 
-@patch("main.invoke_graph")  # Replace 'main' with the name of your FastAPI file if not 'main.py'
+@patch("api.ainvoke_graph")  # patch() swaps the coroutine for an AsyncMock
 def test_chat_endpoint_success(mock_invoke):
     mock_invoke.return_value = {
         "response": "Hello there!",
@@ -45,7 +46,41 @@ def test_chat_endpoint_success(mock_invoke):
     assert data["error"] is None
 
 
-@patch("main.invoke_graph")
+@patch("api.ainvoke_graph")
+def test_chat_endpoint_serializes_bounded_histories(mock_invoke):
+    # Router and support steps carry the live ring buffers, as the real workflow does
+    router_llm = {
+        "calls": deque([{"input": "My payment failed", "output": "support"}], maxlen=64),
+        "total_uses": 1,
+        "last_used": "2025-05-26 14:30:00",
+        "model": "meta-llama/llama-4-maverick-17b-128e-instruct"
+    }
+    tool_usage = deque([{"tool": "create_support_ticket", "input": {}, "output": "ok", "error": None,
+                         "timestamp": "2025-05-26 14:30:01"}], maxlen=256)
+    mock_invoke.return_value = {
+        "response": "Your ticket has been created.",
+        "source_agent_response": "Your ticket has been created.",
+        "agent_workflow": [
+            {"agent_name": "router", "action": "complete_routing", "output": "support",
+             "tool_calls": {"router_llm": router_llm}},
+            {"agent_name": "support", "tool_calls": tool_usage},
+            {"agent_name": "personality", "tool_calls": {"create_support_ticket": deque(tool_usage)}}
+        ],
+        "conversation_active": True,
+        "needs_followup": True,
+        "error": None
+    }
+
+    response = client.post("/chat", json={"message": "My payment failed", "user_id": "user123"})
+    assert response.status_code == 200
+
+    workflow = response.json()["agent_workflow"]
+    assert workflow[0]["tool_calls"]["router_llm"]["calls"] == [{"input": "My payment failed", "output": "support"}]
+    assert workflow[1]["tool_calls"][0]["tool"] == "create_support_ticket"
+    assert isinstance(workflow[2]["tool_calls"]["create_support_ticket"], list)
+
+
+@patch("api.ainvoke_graph")
 def test_chat_endpoint_invalid_response_format(mock_invoke):
     mock_invoke.return_value = "Not a dict"
 
@@ -59,7 +94,7 @@ def test_chat_endpoint_invalid_response_format(mock_invoke):
     assert "Invalid response format" in response.json()["detail"]
 
 
-@patch("main.invoke_graph")
+@patch("api.ainvoke_graph")
 def test_chat_endpoint_raises_exception(mock_invoke):
     mock_invoke.side_effect = RuntimeError("Internal error")
 
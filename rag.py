@@ -1,16 +1,206 @@
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_community.vectorstores import FAISS
+from langchain_community.vectorstores.utils import DistanceStrategy
+from langchain_community.docstore.in_memory import InMemoryDocstore
 from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_community.document_loaders import PyPDFLoader
 from langchain_groq import ChatGroq
+from clients import HTTP_CLIENT, HTTP_ASYNC_CLIENT
+from cache import LLMCache, SemanticCache
 from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.documents import Document
+from concurrent.futures import Future
+from functools import lru_cache
+from typing import List, Optional, Tuple
+import asyncio
+import faiss
+import numpy as np
 import os
+import pickle
+import queue
+import stat
+import threading
+import time
+import pypdfium2 as pdfium
+import torch
 
 from dotenv import load_dotenv
 os.environ.setdefault("USER_AGENT", "MyAppBot/1.0")
 load_dotenv()
 
 
+def _is_file(path: str) -> bool:
+    """Check for a regular file with a single stat() call."""
+    try:
+        return stat.S_ISREG(os.stat(path).st_mode)
+    except FileNotFoundError:
+        return False
+
+def load_pdf_documents(path: str) -> List[Document]:
+    """Extract one Document per PDF page with PDFium, using the same metadata as PyPDFLoader."""
+    pdf = pdfium.PdfDocument(path)
+    try:
+        documents = []
+        for page_number, page in enumerate(pdf):
+            textpage = page.get_textpage()
+            documents.append(Document(
+                page_content=textpage.get_text_range(),
+                metadata={"source": path, "page": page_number}
+            ))
+            textpage.close()
+            page.close()
+        return documents
+    finally:
+        pdf.close()
+
+def normalize_query(query: str) -> str:
+    """Cache key form of a query: lowercased with whitespace collapsed."""
+    return " ".join(query.lower().split())
+
+# Entries kept in each of the RAG manager's search and answer caches
+RAG_CACHE_SIZE = int(os.getenv("RAG_CACHE_SIZE", "512"))
+
+# Cosine similarity at which a paraphrased query reuses an earlier answer
+RAG_SEMANTIC_CACHE_THRESHOLD = float(os.getenv("RAG_SEMANTIC_CACHE_THRESHOLD", "0.95"))
+
+# Chunks embedded per forward pass when building the index
+EMBED_BATCH_SIZE = 64
+
+# Longest a query embedding waits for others to share its batch, in seconds
+EMBED_BATCH_WAIT = float(os.getenv("EMBED_BATCH_WAIT", "0.005"))
+
+# Embedding backend: "torch" (default) or "onnx" for the int8-quantized ONNX export shipped
+# with the model repo (needs sentence-transformers[onnx])
+EMBEDDINGS_BACKEND = os.getenv("EMBEDDINGS_BACKEND", "torch").lower()
+EMBEDDINGS_ONNX_FILE = os.getenv("EMBEDDINGS_ONNX_FILE", "onnx/model_qint8_avx512_vnni.onnx")
+
+# Split the cores between uvicorn workers so torch and faiss don't oversubscribe them
+THREADS_PER_WORKER = max(1, (os.cpu_count() or 1) // int(os.getenv("WEB_CONCURRENCY", "1")))
+
+# OpenMP threads faiss uses per search
+faiss.omp_set_num_threads(int(os.getenv("FAISS_OMP_THREADS", THREADS_PER_WORKER)))
+
+# Intra-op threads for the embedding model; inter-op parallelism only adds contention here
+torch.set_num_threads(int(os.getenv("TORCH_NUM_THREADS", THREADS_PER_WORKER)))
+try:
+    torch.set_num_interop_threads(1)
+except RuntimeError:
+    # Can only be set before torch runs inter-op work; keep the existing setting otherwise
+    pass
+
+# HNSW graph parameters: neighbours per node and candidate list sizes for build/search
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_SEARCH = 64
+
+
+class InferenceEmbeddings(HuggingFaceEmbeddings):
+    """HuggingFaceEmbeddings that encode under torch.inference_mode, skipping autograd bookkeeping."""
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        with torch.inference_mode():
+            return super().embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        with torch.inference_mode():
+            return super().embed_query(text)
+
+
+@lru_cache(maxsize=1)
+def get_embeddings() -> HuggingFaceEmbeddings:
+    """Return the process-wide embeddings model so the SentenceTransformer is loaded only once.
+
+    Embeddings are L2-normalized, so inner product equals cosine similarity. The model
+    is warmed up with one encode so the first real query doesn't pay for lazy initialization.
+    """
+    model_kwargs = {}
+    if EMBEDDINGS_BACKEND == "onnx":
+        model_kwargs = {"backend": "onnx", "model_kwargs": {"file_name": EMBEDDINGS_ONNX_FILE}}
+
+    embeddings = InferenceEmbeddings(
+        model_name="sentence-transformers/all-MiniLM-L6-v2",
+        model_kwargs=model_kwargs,
+        encode_kwargs={
+            "batch_size": EMBED_BATCH_SIZE,
+            "normalize_embeddings": True,
+            "convert_to_numpy": True
+        }
+    )
+    embeddings.embed_query("warm up")
+    return embeddings
+
+
+# Queued by BatchingEmbedder.close() to stop the worker after the queries ahead of it
+_STOP = object()
+
+
+class BatchingEmbedder:
+    """Coalesce concurrent embed_query calls into batched embed_documents calls.
+
+    Callers block on a future while a background thread drains the queue, waiting up to
+    max_wait for more queries (at most max_batch_size) before running one forward pass.
+    """
+
+    def __init__(self, embeddings: HuggingFaceEmbeddings, max_batch_size: int = EMBED_BATCH_SIZE,
+                 max_wait: float = EMBED_BATCH_WAIT):
+        self.embeddings = embeddings
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._queue: "queue.Queue[Tuple[str, Future]]" = queue.Queue()
+        self._worker: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def embed_query(self, text: str) -> List[float]:
+        """Embed one query, sharing the forward pass with any concurrent callers."""
+        future: Future = Future()
+        # Enqueue under the lock so no query lands behind the stop marker of a closing worker
+        with self._lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                self._worker.start()
+            self._queue.put((text, future))
+        return future.result()
+
+    def close(self) -> None:
+        """Embed the queries already queued, then stop the worker; a later query starts a new one."""
+        with self._lock:
+            if self._worker is None:
+                return
+            self._queue.put(_STOP)
+            self._worker.join()
+            self._worker = None
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    # Flush what is already batched without waiting out max_wait
+                    stopping = True
+                    break
+                batch.append(item)
+
+            try:
+                vectors = self.embeddings.embed_documents([text for text, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), vector in zip(batch, vectors):
+                future.set_result(vector)
+
+
 class RAGManager:
     def __init__(self, vector_store_path: str = "vectorstore"):
         """Initialize the RAG manager.
@@ -20,40 +210,81 @@ class RAGManager:
             vector_store_path: Path where the vector store will be saved
         """
         self.vector_store_path = vector_store_path
-        self.embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
+        self.embeddings = get_embeddings()
+        self._query_embedder = BatchingEmbedder(self.embeddings)
         self.llm = ChatGroq(
             model="meta-llama/llama-4-maverick-17b-128e-instruct",
-            temperature=0
+            temperature=0,
+            http_client=HTTP_CLIENT,
+            http_async_client=HTTP_ASYNC_CLIENT
         )
         self.vectorstore = None
 
+        # Normalized query -> embedding, so callers that embed first (the semantic cache) don't pay twice
+        self._query_vectors = LLMCache(maxsize=RAG_CACHE_SIZE)
+
+        # Normalized query -> retrieved docstore ids, and (query, ids) -> answer
+        self._search_cache = LLMCache(maxsize=RAG_CACHE_SIZE)
+        self._answer_cache = LLMCache(maxsize=RAG_CACHE_SIZE)
+
+        # Query embedding -> answer, for paraphrases of earlier questions
+        self._semantic_cache = SemanticCache(threshold=RAG_SEMANTIC_CACHE_THRESHOLD, maxsize=RAG_CACHE_SIZE)
+
+        # Answer prompt and chain are fixed, so build them once per manager
+        self._prompt = ChatPromptTemplate.from_messages([
+            ("system", """You are a helpful assistant that provides accurate information based on the given context.
+            Use the context to answer the question. If the context doesn't contain enough information,
+            say so, but try to provide relevant information from what is available."""),
+            ("human", "Context:\n{context}\n\nQuestion: {query}")
+        ])
+        self._chain = self._prompt | self.llm
+
     def load_or_create_vectorstore(self, force_reload: bool = False) -> None:
         """Load the existing vector store or create a new one if it doesn't exist."""
         vs_file = f"{self.vector_store_path}/faiss_store.faiss"
         pkl_file = f"{self.vector_store_path}/faiss_store.pkl"
-        print("Checking for vector store files...")
-        print(f"vs_file path: {vs_file} - Exists: {os.path.exists(vs_file)}")
-        print(f"pkl_file path: {pkl_file} - Exists: {os.path.exists(pkl_file)}")
-        print(f"force_reload: {force_reload}")
+
+        # Cached ids and answers belong to the previous index
+        self._search_cache.clear()
+        self._answer_cache.clear()
+        self._semantic_cache.clear()
 
         # Check if vector store exists and we're not forcing a reload
-        if os.path.exists(vs_file) and os.path.exists(pkl_file) and not force_reload:
-            print("Loading existing vector store...")
-            self.vectorstore = FAISS.load_local(
-                self.vector_store_path,
-                self.embeddings,
-                "faiss_store",
-                allow_dangerous_deserialization=True
-            )
+        if not force_reload and _is_file(vs_file) and _is_file(pkl_file):
+            self.vectorstore = self._load_vectorstore(vs_file, pkl_file)
         else:
-            print("Creating new vector store...")
             self._create_vectorstore()
 
+    def _load_vectorstore(self, vs_file: str, pkl_file: str) -> FAISS:
+        """Load the saved index and docstore, equivalent to FAISS.load_local.
+
+        The index is read into memory: faiss only memory-maps flat and inverted-list
+        storage, not the IndexHNSWFlat this manager builds.
+        """
+        index = faiss.read_index(vs_file)
+
+        # Same trusted local pickle FAISS.save_local writes
+        with open(pkl_file, "rb") as file:
+            docstore, index_to_docstore_id = pickle.load(file)
+
+        # The distance strategy is not persisted; derive it from the stored index
+        distance_strategy = (
+            DistanceStrategy.MAX_INNER_PRODUCT
+            if index.metric_type == faiss.METRIC_INNER_PRODUCT
+            else DistanceStrategy.EUCLIDEAN_DISTANCE
+        )
+        return FAISS(
+            embedding_function=self.embeddings,
+            index=index,
+            docstore=docstore,
+            index_to_docstore_id=index_to_docstore_id,
+            distance_strategy=distance_strategy
+        )
+
     def _create_vectorstore(self) -> None:
         """Create a new vector store from web content."""
         # Load and process website content
-        loader = PyPDFLoader("pdf/boleto_merged.pdf")
-        documents = loader.load()
+        documents = load_pdf_documents("pdf/boleto_merged.pdf")
 
         # Split documents
         text_splitter = RecursiveCharacterTextSplitter(
@@ -62,8 +293,24 @@ class RAGManager:
         )
         splits = text_splitter.split_documents(documents)
 
-        # Create a vector store
-        self.vectorstore = FAISS.from_documents(splits, self.embeddings)
+        # Embed every chunk in batches, then index them in an HNSW inner-product graph
+        texts = [split.page_content for split in splits]
+        vectors = self.embeddings.embed_documents(texts)
+        index = faiss.IndexHNSWFlat(len(vectors[0]), HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        index.hnsw.efSearch = HNSW_EF_SEARCH
+
+        self.vectorstore = FAISS(
+            embedding_function=self.embeddings,
+            index=index,
+            docstore=InMemoryDocstore(),
+            index_to_docstore_id={},
+            distance_strategy=DistanceStrategy.MAX_INNER_PRODUCT
+        )
+        self.vectorstore.add_embeddings(
+            zip(texts, vectors),
+            metadatas=[split.metadata for split in splits]
+        )
 
         # Create a directory if it doesn't exist
         os.makedirs(self.vector_store_path, exist_ok=True)
@@ -72,6 +319,74 @@ class RAGManager:
         self.vectorstore.save_local(self.vector_store_path, "faiss_store")
         print(f"Vector store saved to {self.vector_store_path}")
 
+    def close(self) -> None:
+        """Stop the query embedding worker once its queued queries are embedded."""
+        self._query_embedder.close()
+
+    def embed_query(self, query_norm: str) -> List[float]:
+        """Embed a normalized query through the batching embedder, reusing recent results."""
+        vector = self._query_vectors.get(query_norm)
+        if vector is None:
+            vector = self._query_embedder.embed_query(query_norm)
+            self._query_vectors.set(query_norm, vector)
+        return vector
+
+    def _search_doc_ids(self, query_norm: str, k: int) -> Tuple[str, ...]:
+        """Return the docstore ids of the top-k chunks for a normalized query, cached by query."""
+        key = (query_norm, k)
+        doc_ids = self._search_cache.get(key)
+        if doc_ids is None:
+            vector = np.asarray([self.embed_query(query_norm)], dtype=np.float32)
+            _, indices = self.vectorstore.index.search(vector, k)
+            doc_ids = tuple(self.vectorstore.index_to_docstore_id[i] for i in indices[0] if i != -1)
+            self._search_cache.set(key, doc_ids)
+        return doc_ids
+
+    def _build_context(self, doc_ids: Tuple[str, ...]) -> str:
+        """Join the text of the retrieved chunks into the prompt context."""
+        return "\n\n".join([self.vectorstore.docstore.search(doc_id).page_content for doc_id in doc_ids])
+
+    def _cacheable(self) -> bool:
+        """Answers are only reused when generation is deterministic."""
+        return self.llm.temperature == 0
+
+    def _retrieve(self, query: str, k: int) -> Tuple[Optional[str], Optional[List[float]], Tuple, str]:
+        """Run the blocking half of a query: embedding, cache lookups and the FAISS search.
+
+        Returns:
+            The cached answer (or None), the query embedding when answers are cached,
+            the answer cache key and the prompt context
+        """
+        if self.vectorstore is None:
+            raise RuntimeError("Vector store not loaded; call load_or_create_vectorstore() first")
+
+        # A paraphrase of an earlier question is answered from the semantic cache; the
+        # embedding is the one the search below uses, so the lookup costs one dot product
+        query_norm = normalize_query(query)
+        query_vector = None
+        if self._cacheable():
+            query_vector = self.embed_query(query_norm)
+            cached = self._semantic_cache.get(query_vector)
+            if cached is not None:
+                return cached, query_vector, (), ""
+
+        # Search for relevant documents
+        doc_ids = self._search_doc_ids(query_norm, k)
+        answer_key = (query_norm, doc_ids)
+        if self._cacheable():
+            cached = self._answer_cache.get(answer_key)
+            if cached is not None:
+                return cached, query_vector, answer_key, ""
+
+        return None, query_vector, answer_key, self._build_context(doc_ids)
+
+    def _store_answer(self, answer: str, query_vector: Optional[List[float]], answer_key: Tuple) -> str:
+        """Cache a generated answer under its retrieval key and its query embedding."""
+        if self._cacheable():
+            self._answer_cache.set(answer_key, answer)
+            self._semantic_cache.set(query_vector, answer)
+        return answer
+
     def query(self, query: str, k: int = 4) -> str:
         """Query the RAG system.
 
@@ -81,32 +396,46 @@ class RAGManager:
 
         Returns:
             Generated response based on retrieved documents
+
+        Raises:
+            RuntimeError: If the vector store has not been loaded yet
         """
-        if not self.vectorstore:
-            self.load_or_create_vectorstore()
+        cached, query_vector, answer_key, context = self._retrieve(query, k)
+        if cached is not None:
+            return cached
 
-        # Search for relevant documents
-        docs = self.vectorstore.similarity_search(query, k=k)
+        # Generate response
+        response = self._chain.invoke({"context": context, "query": query})
+        return self._store_answer(response.content, query_vector, answer_key)
 
-        # Prepare context from documents
-        context = "\n\n".join([doc.page_content for doc in docs])
+    async def aquery(self, query: str, k: int = 4) -> str:
+        """Query the RAG system without blocking the event loop.
 
-        # Create prompt template
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", """You are a helpful assistant that provides accurate information based on the given context.
-            Use the context to answer the question. If the context doesn't contain enough information,
-            say so, but try to provide relevant information from what is available."""),
-            ("human", "Context:\n{context}\n\nQuestion: {query}")
-        ])
+        Args:
+            query: The query string
+            k: Number of relevant documents to retrieve
 
-        # Generate response
-        chain = prompt | self.llm
-        response = chain.invoke({
-            "context": context,
-            "query": query
-        })
+        Returns:
+            Generated response based on retrieved documents
 
-        return response.content
+        Raises:
+            RuntimeError: If the vector store has not been loaded yet
+        """
+        # The embedding and FAISS search run in a worker thread, where concurrent queries
+        # share batched embeddings; the LLM call runs on the shared async client
+        cached, query_vector, answer_key, context = await asyncio.to_thread(self._retrieve, query, k)
+        if cached is not None:
+            return cached
+
+        response = await self._chain.ainvoke({"context": context, "query": query})
+        return self._store_answer(response.content, query_vector, answer_key)
+
+@lru_cache(maxsize=1)
+def get_rag_manager() -> RAGManager:
+    """Return the shared RAG manager with its vector store loaded."""
+    rag = RAGManager()
+    rag.load_or_create_vectorstore()
+    return rag
 
 def main():
     # Example usage
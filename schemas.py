@@ -1,15 +1,45 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict, Field, field_validator
 from typing import Dict, Any, List
 
 
 class ChatRequest(BaseModel):
-    message: str
-    user_id: str
+    # Leading/trailing whitespace is stripped by pydantic-core before the validators run;
+    # emptiness is left to the validators (no min_length) so they keep their error messages
+    model_config = ConfigDict(str_strip_whitespace=True)
+
+    message: str = Field(..., max_length=4000, description="The message to process. Must contain either 'dev' or '123456' and cannot be only numbers")
+    user_id: str = Field(..., max_length=100, description="Unique identifier for the user")
+
+    @field_validator('message')
+    @classmethod
+    def validate_message(cls, v: str) -> str:
+        if not v:
+            raise ValueError("Message cannot be empty or just whitespace")
+        
+        # Check if message contains only numbers
+        if v.replace(" ", "").isdigit():
+            raise ValueError("Message cannot contain only numbers")
+            
+        return v
+
+    @field_validator('user_id')
+    @classmethod
+    def validate_user_id(cls, v: str) -> str:
+        if not v:
+            raise ValueError("User ID cannot be empty or just whitespace")
+        return v
 
 class ChatResponse(BaseModel):
-    response: str
-    source_agent_response: str
-    agent_workflow: List[Dict[str, Any]]
-    conversation_active: bool = True
-    needs_followup: bool = True
-    error: str | None = None
+    response: str = Field(..., description="The main response from the agent system")
+    source_agent_response: str = Field(..., description="Response from the source agent")
+    agent_workflow: List[Dict[str, Any]] = Field(default_factory=list, description="List of agent workflow steps")
+    conversation_active: bool = Field(default=True, description="Whether the conversation is still active")
+    needs_followup: bool = Field(default=True, description="Whether the conversation needs follow-up")
+    error: str | None = Field(default=None, description="Error message if any")
+
+    @field_validator('response', 'source_agent_response')
+    @classmethod
+    def validate_responses(cls, v: str) -> str:
+        if not v or not v.strip():
+            raise ValueError("Response cannot be empty")
+        return v
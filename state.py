@@ -1,13 +1,20 @@
-from typing import List, Dict, Optional, Any
+from dataclasses import dataclass, field
+import asyncio
+from collections import deque
+from typing import List, Deque, Dict, Optional, Any, Callable, Tuple
 from typing_extensions import TypedDict
 from langchain_core.agents import AgentAction, AgentFinish
 from langchain_core.messages import BaseMessage
 
+# Entries kept per tool in tool_outputs and overall in tool_usage; older ones are dropped
+TOOL_HISTORY = 256
+
 class ToolCall(TypedDict):
     """Represents a single tool call."""
     tool: str
     input: Dict[str, Any]
-    output: str
+    output: Optional[str]
+    error: Optional[str]
     timestamp: str
 
 class ToolUsage(TypedDict):
@@ -16,13 +23,19 @@ class ToolUsage(TypedDict):
     total_calls: int
 
 class ToolOutput(TypedDict):
-    """Represents a tool's output."""
+    """Represents a tool's output; same shape as ToolCall, the entry is shared."""
+    tool: str
     input: Dict[str, Any]
-    output: str
+    output: Optional[str]
+    error: Optional[str]
     timestamp: str
 
-class AgentState(TypedDict):
-    """Represents the complete state of the agent during task execution."""
+class AgentState(TypedDict, total=False):
+    """Represents the complete state of the agent during task execution.
+
+    Declares every key the agents read or write so the state stays a plain
+    dict (as LangGraph passes it between nodes) with a fixed, known shape.
+    """
     # Core state
     input: str
     messages: List[BaseMessage]
@@ -30,17 +43,111 @@ class AgentState(TypedDict):
     next: str
     
     # Tool state
-    tool_outputs: Dict[str, List[ToolOutput]]  # Store tool outputs by tool name
-    tool_usage: List[ToolCall]  # Track individual tool calls
+    tool_outputs: Dict[str, Any]  # Deque[ToolOutput] per tool, or a stats dict (router_llm, speculation)
+    tool_usage: Deque[ToolCall]  # Track individual tool calls, bounded to TOOL_HISTORY
     last_tool: Optional[str]  # Last tool used
     tool_result: Optional[Any]  # Current tool result
     
     # Workflow state
     workflow_history: List[Dict[str, Any]]  # Track the agent workflow
     personality_output: Optional[Dict[str, Any]]  # Personality agent output
+    current_agent: Optional[str]  # Current active agent
+    agent_stack: List[str]  # Track agent call stack
+    
+    # Conversation control
+    conversation_active: bool
+    needs_followup: bool
+    task_list: List[Dict[str, Any]]  # Pending tasks
+    history_summary: str  # Rolling summary of messages outside the window
+    history_summary_upto: int  # Number of messages folded into the summary
+    history_summary_task: "asyncio.Task[Tuple[str, int]]"  # Summary being extended in the background
+    
+    # Agent-specific state
+    knowledge_context: Dict[str, Any]  # Store RAG context
+    support_context: Dict[str, Any]  # Store support interaction context
+    personality_config: Dict[str, str]  # Response style settings
+    speculative_knowledge: Dict[str, Any]  # In-flight knowledge query started by the router
     
     # Additional metadata
     error: Optional[str]  # Any error message
     is_complete: Optional[bool]  # Whether the task is complete
 
 
+# Factories for state entries every agent relies on; only missing keys are filled so
+# existing values are never replaced
+STATE_DEFAULTS: Dict[str, Callable[[], Any]] = {
+    "agent_stack": list,
+    "tool_outputs": dict,
+    "tool_usage": lambda: deque(maxlen=TOOL_HISTORY),
+    "workflow_history": list,
+    "knowledge_context": dict,
+    "task_list": list,
+    "conversation_active": lambda: True,
+    "needs_followup": lambda: True,
+    "support_context": lambda: {
+        "current_ticket": None,
+        "current_appointment": None,
+        "interaction_history": []
+    },
+    "personality_config": lambda: {
+        "style": "professional",
+        "tone": "friendly",
+        "language_level": "clear"
+    },
+}
+
+def ensure_state(state: AgentState) -> AgentState:
+    """Fill in any missing shared state entries in one pass."""
+    for key, factory in STATE_DEFAULTS.items():
+        if key not in state:
+            state[key] = factory()
+    return state
+
+def snapshot(value: Any) -> Any:
+    """Copy state data for use outside the graph, with the bounded deques turned into lists.
+
+    Dicts, lists, tuples and deques are copied recursively; anything else is returned as is.
+    Pydantic and orjson can't serialize a deque, so this runs before state leaves the app.
+    """
+    if isinstance(value, dict):
+        return {key: snapshot(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple, deque)):
+        return [snapshot(item) for item in value]
+    return value
+
+
+@dataclass(slots=True)
+class InitialAgentState:
+    """Starting values for a new AgentState; only the input varies per request."""
+    # Core conversation state
+    input: str
+    messages: List[BaseMessage] = field(default_factory=list)
+    next: str = ""
+    error: Optional[str] = None
+    agent_outcome: Optional[AgentFinish] = None
+
+    # Tool tracking
+    tool_outputs: Dict[str, Any] = field(default_factory=dict)  # Store outputs by tool name
+    tool_usage: Deque[ToolCall] = field(default_factory=lambda: deque(maxlen=TOOL_HISTORY))  # Track all tool calls
+    last_tool: Optional[str] = None                             # Last tool used
+    tool_result: Optional[Any] = None                           # Last tool result
+
+    # Workflow state
+    workflow_history: List[Dict[str, Any]] = field(default_factory=list)  # Track agent interactions
+    current_agent: Optional[str] = None                                   # Current active agent
+    agent_stack: List[str] = field(default_factory=list)                  # Track agent call stack
+
+    # Conversation control
+    conversation_active: bool = True
+    needs_followup: bool = True
+    is_complete: bool = False
+    task_list: List[Dict[str, Any]] = field(default_factory=list)  # Pending tasks
+
+    # Agent-specific states
+    personality_output: Optional[Dict[str, Any]] = None
+    knowledge_context: Dict[str, Any] = field(default_factory=dict)  # Store RAG context
+    support_context: Dict[str, Any] = field(default_factory=dict)    # Store support interaction context
+
+    def to_state(self) -> AgentState:
+        """Return the plain dict LangGraph passes between nodes (a shallow copy, unlike dataclasses.asdict)."""
+        return {name: getattr(self, name) for name in self.__slots__}
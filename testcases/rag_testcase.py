@@ -22,14 +22,14 @@ def test_ragmanager_initialization():
 # ---------- Test Vectorstore Load/Create ----------
 
 def test_load_existing_vectorstore(monkeypatch):
-    monkeypatch.setattr(os.path, "exists", lambda path: True)
+    monkeypatch.setattr("rag._is_file", lambda path: True)
 
-    def fake_load_local(path, embeddings, index_name, allow_dangerous_deserialization=False):
+    def fake_load_vectorstore(self, vs_file, pkl_file):
         class DummyStore:
             def similarity_search(self, query, k): return []
         return DummyStore()
 
-    monkeypatch.setattr(FAISS, "load_local", fake_load_local)
+    monkeypatch.setattr(RAGManager, "_load_vectorstore", fake_load_vectorstore)
 
     rag = RAGManager()
     rag.load_or_create_vectorstore()
@@ -37,13 +37,10 @@ def test_load_existing_vectorstore(monkeypatch):
 
 
 def test_create_vectorstore(monkeypatch):
-    monkeypatch.setattr(os.path, "exists", lambda path: False)
+    monkeypatch.setattr("rag._is_file", lambda path: False)
 
     dummy_docs = [{"page_content": "Test page content"}]
 
-    class DummyLoader:
-        def load(self): return dummy_docs
-
     class DummySplitter:
         def split_documents(self, docs): return docs
 
@@ -53,7 +50,7 @@ def test_create_vectorstore(monkeypatch):
         def save_local(self, path, name): pass
         def similarity_search(self, query, k): return []
 
-    monkeypatch.setattr("your_module_file.PyPDFLoader", lambda path: DummyLoader())  # Replace with real filename
+    monkeypatch.setattr("your_module_file.load_pdf_documents", lambda path: dummy_docs)  # Replace with real filename
     monkeypatch.setattr("your_module_file.RecursiveCharacterTextSplitter", lambda *args, **kwargs: DummySplitter())
     monkeypatch.setattr("your_module_file.FAISS", MagicMock(from_documents=DummyStore.from_documents))
 
@@ -64,32 +61,17 @@ def test_create_vectorstore(monkeypatch):
 
 # ---------- Test Query Logic ----------
 
-def test_query_triggers_vectorstore_creation(monkeypatch):
-    called = {"load_or_create": False}
-
+def test_query_requires_loaded_vectorstore():
     rag = RAGManager()
 
-    def mock_load_or_create_vectorstore():
-        called["load_or_create"] = True
-        class DummyStore:
-            def similarity_search(self, query, k): return [{"page_content": "Test content"}]
-        rag.vectorstore = DummyStore()
-
-    rag.load_or_create_vectorstore = mock_load_or_create_vectorstore
-
-    class DummyLLM:
-        def invoke(self, inputs): return type("Obj", (object,), {"content": "Dummy answer"})
-
-    monkeypatch.setattr("your_module_file.ChatPromptTemplate.from_messages", lambda msgs: lambda inputs: DummyLLM())
-
-    result = rag.query("What is your name?")
-    assert result == "Dummy answer"
-    assert called["load_or_create"]
+    with pytest.raises(RuntimeError):
+        rag.query("What is your name?")
 
 
 def test_query_with_no_relevant_docs(monkeypatch):
     rag = RAGManager()
-    rag.vectorstore = type("Dummy", (), {"similarity_search": lambda self, query, k: []})()
+    rag.vectorstore = type("Dummy", (), {})()
+    rag._search_doc_ids = lambda query_norm, k: ()
 
     class DummyLLM:
         def invoke(self, inputs): return type("Obj", (object,), {"content": "Not enough information."})
@@ -103,10 +85,10 @@ def test_query_with_no_relevant_docs(monkeypatch):
 # ---------- Error Handling ----------
 
 def test_pdf_load_failure(monkeypatch):
-    class FailingLoader:
-        def load(self): raise FileNotFoundError("PDF not found")
+    def failing_loader(path):
+        raise FileNotFoundError("PDF not found")
 
-    monkeypatch.setattr("your_module_file.PyPDFLoader", lambda path: FailingLoader())
+    monkeypatch.setattr("rag.load_pdf_documents", failing_loader)
 
     rag = RAGManager()
     with pytest.raises(FileNotFoundError):
@@ -0,0 +1,36 @@
+from cache import LLMCache, SemanticCache
+
+
+def test_make_key_is_order_independent():
+    assert LLMCache.make_key({"input": "hi", "messages": []}) == LLMCache.make_key({"messages": [], "input": "hi"})
+
+def test_get_returns_none_on_miss():
+    cache = LLMCache(maxsize=2)
+    assert cache.get("missing") is None
+
+def test_evicts_least_recently_used():
+    cache = LLMCache(maxsize=2)
+    cache.set("a", "knowledge")
+    cache.set("b", "support")
+    cache.get("a")
+    cache.set("c", "end")
+    assert cache.get("a") == "knowledge"
+    assert cache.get("b") is None
+    assert cache.get("c") == "end"
+    assert len(cache) == 2
+
+def test_semantic_cache_returns_close_match_only():
+    cache = SemanticCache(threshold=0.95, maxsize=4)
+    cache.set([1.0, 0.0, 0.0], "boleto answer")
+    assert cache.get([0.99, 0.05, 0.0]) == "boleto answer"
+    assert cache.get([0.0, 1.0, 0.0]) is None
+
+def test_semantic_cache_overwrites_oldest_when_full():
+    cache = SemanticCache(threshold=0.95, maxsize=2)
+    cache.set([1.0, 0.0], "a")
+    cache.set([0.0, 1.0], "b")
+    cache.set([-1.0, 0.0], "c")
+    assert cache.get([1.0, 0.0]) is None
+    assert cache.get([0.0, 1.0]) == "b"
+    assert cache.get([-1.0, 0.0]) == "c"
+    assert len(cache) == 2
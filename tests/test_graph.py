@@ -0,0 +1,38 @@
+from langgraph.graph import Graph, END
+import graph
+
+
+def _fake_compiled_graph():
+    """Two-node stand-in for the agent graph with the same node names and final output shape."""
+    async def router(state):
+        state["next"] = "knowledge"
+        return state
+
+    async def personality(state):
+        return {
+            "response": "Boleto creation is free.",
+            "source_agent_response": "Boleto creation is free.",
+            "agent_workflow": [],
+            "conversation_active": True,
+            "needs_followup": False,
+            "error": None
+        }
+
+    workflow = Graph()
+    workflow.add_node("router", router)
+    workflow.add_node("personality", personality)
+    workflow.add_edge("router", "personality")
+    workflow.add_edge("personality", END)
+    workflow.set_entry_point("router")
+    return workflow.compile()
+
+async def test_stream_final_event_matches_invoke(monkeypatch):
+    monkeypatch.setattr(graph, "get_compiled_graph", _fake_compiled_graph)
+    message = "Are there any fees for creating boletos?"
+
+    expected = await graph.ainvoke_graph(message)
+    events = [event async for event in graph.astream_graph(message)]
+
+    assert events[-1]["type"] == "final"
+    assert events[-1]["response"] == expected["response"] == "Boleto creation is free."
+    assert events[-1]["needs_followup"] == expected["needs_followup"]
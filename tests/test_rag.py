@@ -0,0 +1,61 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from rag import BatchingEmbedder
+
+
+class FakeEmbeddings:
+    """Embeds "n" as [n] and records every batch it is given."""
+
+    def __init__(self):
+        self.batches = []
+
+    def embed_documents(self, texts):
+        self.batches.append(list(texts))
+        return [[float(text)] for text in texts]
+
+class FailingEmbeddings:
+    def embed_documents(self, texts):
+        raise ValueError("model unavailable")
+
+
+def test_batched_vectors_resolve_to_their_own_queries():
+    embeddings = FakeEmbeddings()
+    embedder = BatchingEmbedder(embeddings, max_batch_size=3, max_wait=0.05)
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(embedder.embed_query, [str(i) for i in range(8)]))
+    embedder.close()
+
+    assert results == [[float(i)] for i in range(8)]
+    assert sorted(text for batch in embeddings.batches for text in batch) == sorted(str(i) for i in range(8))
+    assert all(len(batch) <= 3 for batch in embeddings.batches)
+
+def test_embedding_error_reaches_every_caller():
+    embedder = BatchingEmbedder(FailingEmbeddings(), max_wait=0.01)
+    with pytest.raises(ValueError):
+        embedder.embed_query("1")
+    embedder.close()
+
+def test_close_flushes_queued_queries_and_stops_worker():
+    embedder = BatchingEmbedder(FakeEmbeddings(), max_wait=10)
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        futures = [pool.submit(embedder.embed_query, text) for text in ("1", "2")]
+        time.sleep(0.1)
+        worker = embedder._worker
+
+        started = time.monotonic()
+        embedder.close()
+
+        # Without the stop marker the batch would wait out the 10 s max_wait
+        assert [future.result(timeout=1) for future in futures] == [[1.0], [2.0]]
+    assert time.monotonic() - started < 5
+    assert not worker.is_alive()
+    assert embedder._worker is None
+
+def test_query_after_close_starts_a_new_worker():
+    embedder = BatchingEmbedder(FakeEmbeddings(), max_wait=0.01)
+    assert embedder.embed_query("1") == [1.0]
+    embedder.close()
+    assert embedder.embed_query("2") == [2.0]
+    assert embedder._worker is not None and embedder._worker.is_alive()
+    embedder.close()
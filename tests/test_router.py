@@ -0,0 +1,23 @@
+import pytest
+from agents.router import _fast_route
+
+
+@pytest.mark.parametrize("message, expected", [
+    ("I got an error with my payment", "support"),
+    ("ERROR on my REFUND request", "support"),
+    ("I want to schedule a call about a problem", "support"),
+    ("What services and pricing does the API have?", "knowledge"),
+    ("How much are the features of the tap to pay?", "knowledge"),
+])
+def test_fast_route_matches_unambiguous_input(message, expected):
+    assert _fast_route(message) == expected
+
+@pytest.mark.parametrize("message", [
+    "Hello there",
+    "My payment",  # a single keyword hit
+    "error error error",  # repeated hits count once
+    "Payment error with the API pricing",  # hits on both sides cancel out
+    "My apis keep calling back",  # keywords only match whole words
+])
+def test_fast_route_defers_to_llm(message):
+    assert _fast_route(message) is None
@@ -1,12 +1,171 @@
-from langchain_core.tools import tool
-from state import AgentState
+from langchain_core.tools import StructuredTool
+from state import TOOL_HISTORY, AgentState
+from collections import deque
 from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
+import asyncio
+import logging
+import queue
+import threading
 import uuid
-from rag import RAGManager
+from typing import Any, Dict, Optional, Tuple, Union
+from pydantic import BaseModel, Field
+from rag import get_rag_manager
 
+# Audit log of created tickets and appointments. While the app runs, records are also
+# handed to a queue and written to stderr by a listener thread, so the tools never
+# wait on the stream; records still propagate to the root handlers
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+_log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+_queue_handler = QueueHandler(_log_queue)
+_audit_handler = logging.StreamHandler()
+_audit_handler.setFormatter(logging.Formatter("[SYSTEM] %(message)s"))
+_log_listener = QueueListener(_log_queue, _audit_handler)
 
-@tool
-def rag_search(query: str, state: AgentState = None) -> str:
+
+def start_audit_log() -> None:
+    """Start writing audit records from the listener thread; called by the app lifespan."""
+    logger.addHandler(_queue_handler)
+    _log_listener.start()
+
+
+def stop_audit_log() -> None:
+    """Flush the queued audit records and stop the listener thread."""
+    logger.removeHandler(_queue_handler)
+    _log_listener.stop()
+
+# Guards state writes when tools run concurrently (e.g. the async siblings under
+# asyncio.gather). A module-level lock rather than one stored in the state, which
+# would leak into the serialized graph result; the critical section is a few appends
+_STATE_LOCK = threading.Lock()
+
+# Timestamp format for tool outputs and usage records
+_TS_FMT = "%Y-%m-%d %H:%M:%S"
+
+# Accepted values for the support tools' options; anything else falls back to the default
+_PRIORITIES = frozenset(("low", "normal", "high", "urgent"))
+_CATEGORIES = frozenset(("billing", "technical", "account", "general", "refund"))
+_CALL_TYPES = frozenset(("technical", "billing", "consultation", "general"))
+
+# Confirmation messages returned by the support tools
+_TICKET_TEMPLATE = """
+    ✅ Support Ticket Created Successfully!
+    Ticket ID: {ticket_id}
+    Issue Description: {issue_description}
+    Expected Response Time:
+    - Low: 24-48 hrs | Normal: 12-24 hrs | High: 4-8 hrs | Urgent: 1-2 hrs
+    """
+
+_APPOINTMENT_TEMPLATE = """
+    📞 Support Call Scheduled Successfully!
+    Appointment ID: {appointment_id}
+    Scheduled: {formatted_date} at {formatted_time}
+    Call Type: {call_type}
+    Issue: {issue_summary}
+    Note: Calls occur only during business hours (9 AM - 5 PM, Mon-Fri).
+    """
+
+def _tool_entry(
+    tool_name: str,
+    tool_input: Dict[str, Any],
+    output: Optional[str],
+    timestamp: str,
+    error: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    build a tool_outputs / tool_usage entry; successful and failed calls share one shape.
+
+    Args:
+        tool_name (str): Name of the tool that ran.
+        tool_input (Dict[str, Any]): Arguments the tool ran with.
+        output (Optional[str]): The tool result, None on failure.
+        timestamp (str): When the call completed.
+        error (str, optional): Error message, None on success.
+
+    Returns:
+        Dict[str, Any]: The entry.
+    """
+    return {"tool": tool_name, "input": tool_input, "output": output, "error": error, "timestamp": timestamp}
+
+
+def _record_tool_use(
+    state: AgentState,
+    tool_name: str,
+    tool_input: Dict[str, Any],
+    output: Optional[str],
+    timestamp: str,
+    usage_input: Optional[Dict[str, Any]] = None,
+    error: Optional[str] = None
+) -> None:
+    """
+    record a tool call in the agent state with one lookup per container; safe to call from concurrent tools.
+
+    Args:
+        state (AgentState): The agent's current state.
+        tool_name (str): Name of the tool that ran.
+        tool_input (Dict[str, Any]): Arguments stored with the tool output.
+        output (Optional[str]): The tool result.
+        timestamp (str): When the call completed.
+        usage_input (Dict[str, Any], optional): Input stored in tool_usage, if different from tool_input.
+        error (str, optional): Error message; failed calls are kept out of tool_usage.
+    """
+    # Build the entries outside the lock; only the container updates need to be atomic.
+    # One read-only entry serves both logs unless tool_usage records a different input
+    entry = _tool_entry(tool_name, tool_input, output, timestamp, error)
+    if error is None and usage_input is not None:
+        usage_entry = _tool_entry(tool_name, usage_input, output, timestamp)
+    else:
+        usage_entry = entry
+
+    with _STATE_LOCK:
+        tool_outputs = state.get("tool_outputs")
+        if tool_outputs is None:
+            tool_outputs = state["tool_outputs"] = {}
+        calls = tool_outputs.get(tool_name)
+        if not isinstance(calls, deque):
+            calls = tool_outputs[tool_name] = deque(calls or (), maxlen=TOOL_HISTORY)
+        calls.append(entry)
+        state["last_tool"] = tool_name
+
+        if error is not None:
+            state["error"] = error
+            return
+
+        tool_usage = state.get("tool_usage")
+        if not isinstance(tool_usage, deque):
+            tool_usage = state["tool_usage"] = deque(tool_usage or (), maxlen=TOOL_HISTORY)
+        tool_usage.append(usage_entry)
+        state["tool_result"] = output
+
+
+# Tool argument schemas, declared up front so the tools don't infer them from their
+# signatures; the agent state is passed by callers directly and is not a tool argument
+class RAGSearchArgs(BaseModel):
+    query: str = Field(..., description="The search query")
+
+
+class SupportTicketArgs(BaseModel):
+    issue_description: str = Field(..., description="Description of the issue")
+    priority: str = Field(default="normal", description="Ticket priority. Options: low, normal, high, urgent")
+    category: str = Field(default="general", description="Issue category. Options: billing, technical, account, general, refund")
+
+
+class SupportCallArgs(BaseModel):
+    issue_summary: str = Field(..., description="Brief issue summary")
+    call_type: str = Field(default="general", description="Type of call (technical, billing, consultation, general)")
+
+
+def _record_rag_search(state: AgentState, query: str, result: Optional[str], error: Optional[str] = None) -> None:
+    """Record a rag_search call in the agent state, if there is one."""
+    if state is not None:
+        _record_tool_use(
+            state, "rag_search", {"query": query}, result, datetime.now().strftime(_TS_FMT),
+            error=error
+        )
+
+
+def _rag_search(query: str, state: AgentState = None) -> str:
     """
     search for information using RAG (Retrieval-Augmented Generation).
 
@@ -17,45 +176,44 @@ def rag_search(query: str, state: AgentState = None) -> str:
     Returns:
         str: The search result or error message.
     """
-    rag_manager = RAGManager()
-    rag_manager.load_or_create_vectorstore()
     try:
-        result = rag_manager.query(query)
-
-        if state is not None:
-            tool_output = {
-                "input": {"query": query},
-                "output": result,
-                "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            }
-            state.setdefault("tool_outputs", {}).setdefault("rag_search", []).append(tool_output)
-            state.setdefault("tool_usage", []).append({
-                "tool": "rag_search",
-                "input": {"query": query},
-                "output": result,
-                "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            })
-            state["last_tool"] = "rag_search"
-            state["tool_result"] = result
-
-        return result
+        # Shared per-process manager; the vector store is loaded once, not per search.
+        # Its answer and semantic caches are cleared whenever the index is reloaded
+        result = get_rag_manager().query(query)
+    except Exception as e:
+        error_message = f"RAG search error: {str(e)}"
+        _record_rag_search(state, query, None, error_message)
+        return error_message
+
+    _record_rag_search(state, query, result)
+    return result
 
+
+async def arag_search(query: str, state: AgentState = None) -> str:
+    """Async variant of rag_search: embedding and search run in a worker thread, where
+    concurrent searches share batched embeddings, and generation on the async LLM client."""
+    try:
+        result = await get_rag_manager().aquery(query)
     except Exception as e:
         error_message = f"RAG search error: {str(e)}"
-        if state is not None:
-            state.setdefault("tool_outputs", {}).setdefault("rag_search", []).append({
-                "input": {"query": query},
-                "output": None,
-                "error": error_message,
-                "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            })
-            state["error"] = error_message
-            state["last_tool"] = "rag_search"
+        _record_rag_search(state, query, None, error_message)
         return error_message
 
+    _record_rag_search(state, query, result)
+    return result
+
 
-@tool
-def create_support_ticket(
+# Registered with both entry points so async agents (tool.ainvoke) await the coroutine
+# instead of blocking on the sync body
+rag_search = StructuredTool.from_function(
+    func=_rag_search,
+    coroutine=arag_search,
+    name="rag_search",
+    args_schema=RAGSearchArgs
+)
+
+
+def _create_support_ticket(
     issue_description: str,
     priority: str = "normal",
     category: str = "general",
@@ -73,51 +231,98 @@ def create_support_ticket(
     Returns:
         str: Ticket confirmation message.
     """
-    ticket_id = f"TICK-{str(uuid.uuid4())[:8].upper()}"
+    ticket_id = f"TICK-{uuid.uuid4().hex[:8].upper()}"
 
-    if priority.lower() not in ["low", "normal", "high", "urgent"]:
+    # Normalize each option once and use the lowered value from here on
+    priority = priority.lower()
+    if priority not in _PRIORITIES:
         priority = "normal"
-    if category.lower() not in ["billing", "technical", "account", "general", "refund"]:
+    category = category.lower()
+    if category not in _CATEGORIES:
         category = "general"
 
     ticket_data = {
         "ticket_id": ticket_id,
         "issue_description": issue_description
     }
-    print(f"[SYSTEM] Ticket created in database: {ticket_data}")
+    logger.info("Ticket created in database: %s", ticket_data)
 
-    response = f"""
-    ✅ Support Ticket Created Successfully!
-    Ticket ID: {ticket_id}
-    Issue Description: {issue_description}
-    Expected Response Time:
-    - Low: 24-48 hrs | Normal: 12-24 hrs | High: 4-8 hrs | Urgent: 1-2 hrs
-    """
+    response = _TICKET_TEMPLATE.format(ticket_id=ticket_id, issue_description=issue_description)
 
     if state is not None:
-        state.setdefault("tool_outputs", {}).setdefault("create_support_ticket", []).append({
-            "input": {
+        _record_tool_use(
+            state,
+            "create_support_ticket",
+            {
                 "issue_description": issue_description,
                 "priority": priority,
                 "category": category
             },
-            "output": response,
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        })
-        state.setdefault("tool_usage", []).append({
-            "tool": "create_support_ticket",
-            "input": ticket_data,
-            "output": response,
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        })
-        state["last_tool"] = "create_support_ticket"
-        state["tool_result"] = response
+            response,
+            datetime.now().strftime(_TS_FMT),
+            usage_input=ticket_data
+        )
 
     return response
 
 
-@tool
-def schedule_support_call(
+async def acreate_support_ticket(
+    issue_description: str,
+    priority: str = "normal",
+    category: str = "general",
+    state: AgentState = None
+) -> str:
+    """Async variant of create_support_ticket, run in a worker thread."""
+    return await asyncio.to_thread(_create_support_ticket, issue_description, priority, category, state)
+
+
+create_support_ticket = StructuredTool.from_function(
+    func=_create_support_ticket,
+    coroutine=acreate_support_ticket,
+    name="create_support_ticket",
+    args_schema=SupportTicketArgs
+)
+
+
+# Scheduling error messages
+_ERR_FORMAT = "❌ Error: Date format (YYYY-MM-DD) and time format (HH:MM) required."
+_ERR_HOURS = "❌ Error: Time must be between 9:00 AM and 5:00 PM."
+_ERR_WEEKDAY = "❌ Error: Appointments only on weekdays."
+
+
+def _parse_slot(preferred_date: str, preferred_time: str) -> Union[Tuple[str, str], str]:
+    """
+    validate a requested call slot.
+
+    Args:
+        preferred_date (str): Call date (YYYY-MM-DD).
+        preferred_time (str): Call time (HH:MM).
+
+    Returns:
+        Tuple[str, str] | str: The formatted (date, time) pair, or an error message.
+    """
+    try:
+        # One C-level ISO parse instead of two strptime calls and a combine
+        appointment = datetime.fromisoformat(f"{preferred_date}T{preferred_time}")
+    except ValueError:
+        return _ERR_FORMAT
+
+    if appointment.hour < 9 or appointment.hour >= 17:
+        return _ERR_HOURS
+    if appointment.weekday() >= 5:
+        return _ERR_WEEKDAY
+
+    return appointment.strftime("%A, %B %d, %Y"), appointment.strftime("%I:%M %p")
+
+
+# Every call is currently booked into this fixed slot, so it is parsed, validated
+# and formatted once at import rather than on each call
+_PREFERRED_DATE = "2025-05-26"
+_PREFERRED_TIME = "14:30"
+_DEFAULT_SLOT = _parse_slot(_PREFERRED_DATE, _PREFERRED_TIME)
+
+
+def _schedule_support_call(
     
     issue_summary: str,
     call_type: str = "general",
@@ -137,28 +342,20 @@ def schedule_support_call(
         str: Appointment confirmation or error message.
     """
 
-    preferred_date = "2025-05-26"
-    preferred_time= "14:30"
-    appointment_id = f"APT-{str(uuid.uuid4())[:8].upper()}"
-    if call_type.lower() not in ["technical", "billing", "consultation", "general"]:
-        call_type = "general"
+    # The slot was parsed and validated at import; an error string means it is not bookable,
+    # so bail out before generating an id or doing any other work
+    if isinstance(_DEFAULT_SLOT, str):
+        return _DEFAULT_SLOT
+    formatted_date, formatted_time = _DEFAULT_SLOT
 
-    try:
-        appointment_date = datetime.strptime(preferred_date, "%Y-%m-%d")
-        appointment_time = datetime.strptime(preferred_time, "%H:%M").time()
-        full_dt = datetime.combine(appointment_date.date(), appointment_time)
-
-        
-        if appointment_time.hour < 9 or appointment_time.hour >= 17:
-            return "❌ Error: Time must be between 9:00 AM and 5:00 PM."
-        if appointment_date.weekday() >= 5:
-            return "❌ Error: Appointments only on weekdays."
-
-    except ValueError:
-        return "❌ Error: Date format (YYYY-MM-DD) and time format (HH:MM) required."
+    preferred_date = _PREFERRED_DATE
+    preferred_time = _PREFERRED_TIME
+    appointment_id = f"APT-{uuid.uuid4().hex[:8].upper()}"
+    call_type = call_type.lower()
+    if call_type not in _CALL_TYPES:
+        call_type = "general"
 
-    formatted_date = appointment_date.strftime("%A, %B %d, %Y")
-    formatted_time = appointment_time.strftime("%I:%M %p")
+    timestamp = datetime.now().strftime(_TS_FMT)
 
     appointment_data = {
         "appointment_id": appointment_id,
@@ -166,39 +363,50 @@ def schedule_support_call(
         "time": preferred_time,
         "formatted_datetime": f"{formatted_date} at {formatted_time}",
         "issue_summary": issue_summary,
-        "call_type": call_type.lower(),
+        "call_type": call_type,
         "status": "scheduled",
-        "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        "created_at": timestamp
     }
-    print(f"[SYSTEM] Appointment scheduled in system: {appointment_data}")
+    logger.info("Appointment scheduled in system: %s", appointment_data)
 
-    response = f"""
-    📞 Support Call Scheduled Successfully!
-    Appointment ID: {appointment_id}
-    Scheduled: {formatted_date} at {formatted_time}
-    Call Type: {call_type.title()}
-    Issue: {issue_summary}
-    Note: Calls occur only during business hours (9 AM - 5 PM, Mon-Fri).
-    """
+    response = _APPOINTMENT_TEMPLATE.format(
+        appointment_id=appointment_id,
+        formatted_date=formatted_date,
+        formatted_time=formatted_time,
+        call_type=call_type.title(),
+        issue_summary=issue_summary
+    )
 
     if state is not None:
-        state.setdefault("tool_outputs", {}).setdefault("schedule_support_call", []).append({
-            "input": {
+        _record_tool_use(
+            state,
+            "schedule_support_call",
+            {
                 "preferred_date": preferred_date,
                 "preferred_time": preferred_time,
                 "issue_summary": issue_summary,
                 "call_type": call_type
             },
-            "output": response,
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        })
-        state.setdefault("tool_usage", []).append({
-            "tool": "schedule_support_call",
-            "input": appointment_data,
-            "output": response,
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        })
-        state["last_tool"] = "schedule_support_call"
-        state["tool_result"] = response
+            response,
+            timestamp,
+            usage_input=appointment_data
+        )
 
     return response
+
+
+async def aschedule_support_call(
+    issue_summary: str,
+    call_type: str = "general",
+    state: AgentState = None
+) -> str:
+    """Async variant of schedule_support_call, run in a worker thread."""
+    return await asyncio.to_thread(_schedule_support_call, issue_summary, call_type, state)
+
+
+schedule_support_call = StructuredTool.from_function(
+    func=_schedule_support_call,
+    coroutine=aschedule_support_call,
+    name="schedule_support_call",
+    args_schema=SupportCallArgs
+)